@@ -0,0 +1,89 @@
+"""Report how long gen.py takes to start for the offline commands
+
+Runs each command under `python -X importtime` in a scratch directory (so the
+real used files and log aren't touched) and prints the total startup time and
+the slowest imports. Exits with an error if an offline command imported any of
+the network modules, which is what the test suite checks too.
+
+Usage: python bench_startup.py [--top N]
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+GEN = Path(__file__).resolve().parent / "gen.py"
+
+# Commands that should never need the network
+OFFLINE_COMMANDS = [
+    ["--count"],
+    ["--dry-run"],
+    ["--nth", "0"],
+]
+
+# Modules offline commands shouldn't import
+NETWORK_MODULES = {"mastodon", "requests", "ftplib", "urllib3"}
+
+
+def run_importtime(args: list[str]) -> tuple[float, list[tuple[int, str]]]:
+    """Run gen.py with `args`, returning the wall time and (cumulative us, module) pairs"""
+    with tempfile.TemporaryDirectory() as cwd:
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", str(GEN), "--no-log", *args],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed = time.perf_counter() - start
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        # Nested imports are indented, keep that so top-level ones can be told apart
+        imports.append((int(cumulative), name[1:].rstrip()))
+    return elapsed, imports
+
+
+def network_imports(imports: list[tuple[int, str]]) -> set[str]:
+    """Get the network modules that appear in an importtime report"""
+    return {
+        name.strip()
+        for _, name in imports
+        if name.strip().split(".")[0] in NETWORK_MODULES
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark gen.py cold start")
+    parser.add_argument(
+        "--top",
+        action="store",
+        help="How many of the slowest imports to show (default: 10)",
+        type=int,
+        default=10,
+        metavar="N",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for command in OFFLINE_COMMANDS:
+        elapsed, imports = run_importtime(command)
+        total_us = sum(cumulative for cumulative, name in imports if name[0] != " ")
+        print(f"gen.py {' '.join(command)}: {elapsed * 1000:.0f} ms wall")
+        print(f"  {len(imports)} imports, {total_us / 1000:.1f} ms cumulative")
+        for cumulative, name in sorted(imports, reverse=True)[: args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name.strip()}")
+        unwanted = network_imports(imports)
+        if unwanted:
+            print(f"  ERROR: imported {', '.join(sorted(unwanted))}")
+            failed = True
+        print()
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import math
+import os
+
+POSTED_FILE = "posted.bloom"
+
+
+class BloomFilter:
+    """A fixed-size set of strings that can only say "maybe" or "definitely not"
+
+    Holding `capacity` strings, a lookup wrongly says "maybe" at most
+    `error_rate` of the time. Each string sets `hashes` bits, picked from one
+    blake2b digest by double hashing.
+    """
+
+    __slots__ = ("capacity", "error_rate", "count", "hashes", "bits")
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(size / capacity * math.log(2)))
+        self.bits = bytearray((size + 7) // 8)
+
+    @property
+    def size(self) -> int:
+        return len(self.bits) * 8
+
+    def positions(self, value: str) -> list[int]:
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self.bits[bit >> 3] >> (bit & 7) & 1 for bit in self.positions(value)
+        )
+
+    def add(self, value: str) -> None:
+        for bit in self.positions(value):
+            self.bits[bit >> 3] |= 1 << (bit & 7)
+        self.count += 1
+
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """A Bloom filter that grows, by adding bigger and stricter filters as it fills
+
+    Each new filter holds GROWTH times as many strings as the last, with
+    TIGHTENING times the error rate, so the chance of any false "maybe" stays
+    under twice the first filter's error rate however many strings are added.
+    The filters are saved to one binary file: a JSON line describing them,
+    followed by their bits.
+    """
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, capacity: int = 10_000, error_rate: float = 0.001) -> None:
+        self.filters = [BloomFilter(capacity, error_rate)]
+
+    def __contains__(self, value: str) -> bool:
+        return any(value in bloom for bloom in self.filters)
+
+    def __len__(self) -> int:
+        return sum(bloom.count for bloom in self.filters)
+
+    def add(self, value: str) -> None:
+        """Add a string, unless it's (probably) already there"""
+        if value in self:
+            return
+        last = self.filters[-1]
+        if last.is_full():
+            last = BloomFilter(
+                last.capacity * self.GROWTH, last.error_rate * self.TIGHTENING
+            )
+            self.filters.append(last)
+        last.add(value)
+
+    @classmethod
+    def load(cls, filename: str) -> "ScalableBloomFilter":
+        with open(filename, "rb") as f:
+            header = json.loads(f.readline())
+            filters = []
+            for saved in header["filters"]:
+                bloom = BloomFilter(saved["capacity"], saved["error_rate"])
+                bloom.bits = bytearray(f.read(len(bloom.bits)))
+                bloom.count = saved["count"]
+                filters.append(bloom)
+        bloom_filter = cls.__new__(cls)
+        bloom_filter.filters = filters
+        return bloom_filter
+
+    def save(self, filename: str) -> None:
+        """Save the filters, replacing the old file in one go"""
+        header = {
+            "version": 1,
+            "filters": [
+                {
+                    "capacity": bloom.capacity,
+                    "error_rate": bloom.error_rate,
+                    "count": bloom.count,
+                }
+                for bloom in self.filters
+            ],
+        }
+        with open(filename + ".tmp", "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            for bloom in self.filters:
+                f.write(bloom.bits)
+        os.replace(filename + ".tmp", filename)
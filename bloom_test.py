@@ -0,0 +1,34 @@
+from bloom import BloomFilter, ScalableBloomFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    for n in range(1000):
+        bloom.add(f"status {n}")
+    assert all(f"status {n}" in bloom for n in range(1000))
+    false_positives = sum(f"other {n}" in bloom for n in range(10000))
+    assert false_positives < 200
+
+
+def test_scalable_bloom_filter_grows():
+    posted = ScalableBloomFilter(capacity=100, error_rate=0.01)
+    for n in range(1000):
+        posted.add(f"status {n}")
+    assert len(posted.filters) == 4
+    assert posted.filters[-1].capacity == 800
+    assert all(f"status {n}" in posted for n in range(1000))
+    # Up to twice the first filter's error rate
+    assert sum(f"other {n}" in posted for n in range(10000)) < 300
+
+
+def test_scalable_bloom_filter_round_trip(tmp_path):
+    filename = str(tmp_path / "posted.bloom")
+    posted = ScalableBloomFilter(capacity=10, error_rate=0.01)
+    for n in range(25):
+        posted.add(f"status {n}")
+    posted.save(filename)
+
+    loaded = ScalableBloomFilter.load(filename)
+    assert len(loaded) == len(posted)
+    assert [b.bits for b in loaded.filters] == [b.bits for b in posted.filters]
+    assert all(f"status {n}" in loaded for n in range(25))
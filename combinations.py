@@ -0,0 +1,175 @@
+import functools
+import hashlib
+from collections.abc import Iterator
+from treats import FOLX_ITEMS, TREAT_ITEMS, Item
+
+
+class FeistelPermutation:
+    """A keyed, pseudo-random bijection over range(size)
+
+    Walking permutation(0), permutation(1), ... visits every number in
+    range(size) exactly once in a shuffled order, and only the key has to be
+    kept to carry on later. It's a balanced Feistel network over the smallest
+    even number of bits that fits `size`, and results outside the range are
+    fed back in ("cycle walking") until they land inside it.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size: int, key: bytes) -> None:
+        if size < 1:
+            raise ValueError("Can't permute an empty range")
+        self.size = size
+        self.key = key
+        bits = max(2, (size - 1).bit_length())
+        self.half = (bits + 1) // 2
+        self.mask = (1 << self.half) - 1
+
+    def round(self, number: int, value: int) -> int:
+        data = bytes([number]) + value.to_bytes(8, "little")
+        digest = hashlib.blake2b(data, digest_size=8, key=self.key).digest()
+        return int.from_bytes(digest, "little") & self.mask
+
+    def encrypt(self, value: int) -> int:
+        left, right = value >> self.half, value & self.mask
+        for number in range(self.ROUNDS):
+            left, right = right, left ^ self.round(number, right)
+        return (left << self.half) | right
+
+    def __call__(self, value: int) -> int:
+        if not 0 <= value < self.size:
+            raise IndexError(f"{value} is outside range({self.size})")
+        value = self.encrypt(value)
+        while value >= self.size:
+            value = self.encrypt(value)
+        return value
+
+
+# Every status the bot can make has a number. Combination n is a threat if n is
+# odd, and otherwise uses pair n // 2, which is folx pair // len(TREAT_ITEMS)
+# and treat pair % len(TREAT_ITEMS).
+
+
+def combination_count() -> int:
+    """Get the number of different statuses, counting treats and threats"""
+    return len(FOLX_ITEMS) * len(TREAT_ITEMS) * 2
+
+
+def pair_items(pair: int) -> tuple[Item, Item]:
+    """Get the folx and treat for a pair number"""
+    folx, treat = divmod(pair, len(TREAT_ITEMS))
+    return FOLX_ITEMS[folx], TREAT_ITEMS[treat]
+
+
+def nth_combination(n: int) -> tuple[Item, Item, bool]:
+    """Get the folx, treat and whether it's a threat for combination n"""
+    if not 0 <= n < combination_count():
+        raise IndexError(f"There are only {combination_count():,} combinations")
+    pair, threat = divmod(n, 2)
+    return *pair_items(pair), bool(threat)
+
+
+def combination_index(folx: int, treat: int, threat: bool) -> int:
+    """Get the combination number for a folx and treat position"""
+    return (folx * len(TREAT_ITEMS) + treat) * 2 + int(threat)
+
+
+def shard_range(shard: int, shards: int) -> range:
+    """Get the combination numbers in one of `shards` equal, non-overlapping parts"""
+    if not 0 <= shard < shards:
+        raise ValueError(f"Shard {shard} doesn't exist, there are {shards}")
+    count = combination_count()
+    return range(count * shard // shards, count * (shard + 1) // shards)
+
+
+def iter_combinations(numbers: range) -> Iterator[tuple[int, Item, Item, bool]]:
+    """Yield the number, folx, treat and threat flag of each combination in turn
+
+    This is a generator, so it works in constant memory however big the lists
+    get.
+    """
+    for n in numbers:
+        yield n, *nth_combination(n)
+
+
+class PrefixTrie:
+    """A trie of strings, for finding which of them another string starts with
+
+    Finding every key that a string starts with takes one step per character
+    of the string, however many keys there are.
+    """
+
+    __slots__ = ("root",)
+
+    def __init__(self, keys: dict[str, int]) -> None:
+        # Each node maps a character to the next node, and None to the value
+        # of the key that ends there
+        self.root: dict = {}
+        for key, value in keys.items():
+            node = self.root
+            for char in key:
+                node = node.setdefault(char, {})
+            node[None] = value
+
+    def prefixes(self, text: str, start: int = 0) -> Iterator[tuple[int, int]]:
+        """Yield (end, value) for each key that text[start:end] is, shortest first"""
+        node = self.root
+        for end in range(start, len(text)):
+            if None in node:
+                yield end, node[None]
+            node = node.get(text[end])
+            if node is None:
+                return
+        if None in node:
+            yield len(text), node[None]
+
+    def get(self, text: str, start: int = 0) -> int | None:
+        """Get the value for text[start:] if it's a key"""
+        node = self.root
+        for end in range(start, len(text)):
+            node = node.get(text[end])
+            if node is None:
+                return None
+        return node.get(None)
+
+
+@functools.cache
+def reverse_index() -> tuple[PrefixTrie, PrefixTrie]:
+    """Build tries of the folx, and of everything after the folx for each treat"""
+    folx = PrefixTrie({item.text: index for index, item in enumerate(FOLX_ITEMS)})
+    treats = {}
+    for index, item in enumerate(TREAT_ITEMS):
+        treats[item.text if item.alt_wording else f"can have {item.text}"] = index
+    return folx, PrefixTrie(treats)
+
+
+def parse_status(status: str) -> tuple[int, int, bool] | None:
+    """Find the folx position, treat position and threat flag of a status
+
+    The status is read once through the folx trie. Each folx it could start
+    with is followed by a space and then has to be exactly one of the treats,
+    which is one more walk through the rest of the status. Returns None if the
+    bot can't have made the status.
+    """
+    for suffix, threat in ((", as a treat", False), (", as a threat", True)):
+        if status.endswith(suffix):
+            middle = status.removesuffix(suffix)
+            break
+    else:
+        return None
+
+    folx, treats = reverse_index()
+    for end, folx_index in folx.prefixes(middle):
+        if middle.startswith(" ", end):
+            treat_index = treats.get(middle, end + 1)
+            if treat_index is not None:
+                return folx_index, treat_index, threat
+    return None
+
+
+def index_of(status: str) -> int | None:
+    """Find the combination number for a status, or None if the bot can't make it"""
+    parsed = parse_status(status)
+    if parsed is None:
+        return None
+    return combination_index(*parsed)
@@ -0,0 +1,63 @@
+import pytest
+from combinations import (
+    FeistelPermutation,
+    PrefixTrie,
+    combination_count,
+    index_of,
+    iter_combinations,
+    nth_combination,
+    shard_range,
+)
+from treats import render
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 17, 1000, 4097])
+def test_permutation_is_bijection(size):
+    permutation = FeistelPermutation(size, b"key")
+    assert sorted(permutation(n) for n in range(size)) == list(range(size))
+
+
+def test_permutation_depends_on_key():
+    first = FeistelPermutation(1000, b"one")
+    second = FeistelPermutation(1000, b"two")
+    assert [first(n) for n in range(10)] != [second(n) for n in range(10)]
+
+
+def test_nth_and_index_of_round_trip():
+    for n in (0, 1, 2, 12345, combination_count() - 1):
+        assert index_of(render(*nth_combination(n))) == n
+
+
+def test_nth_out_of_range():
+    with pytest.raises(IndexError):
+        nth_combination(combination_count())
+
+
+def test_index_of_unknown_status():
+    assert index_of("Nobody can have anything, as a treat") is None
+    assert index_of("Not a status at all") is None
+
+
+def test_prefix_trie():
+    trie = PrefixTrie({"cat": 0, "cats": 1, "cats and dogs": 2, "dog": 3})
+    assert list(trie.prefixes("cats and dogs too")) == [(3, 0), (4, 1), (13, 2)]
+    assert list(trie.prefixes("the cats", 4)) == [(7, 0), (8, 1)]
+    assert list(trie.prefixes("ca")) == []
+    assert trie.get("cats") == 1
+    assert trie.get("a dog", 2) == 3
+    assert trie.get("ca") is None
+    assert trie.get("catsup") is None
+
+
+def test_shards_cover_everything_once():
+    shards = [shard_range(shard, 3) for shard in range(3)]
+    assert shards[0].start == 0
+    assert shards[-1].stop == combination_count()
+    for before, after in zip(shards, shards[1:]):
+        assert before.stop == after.start
+
+
+def test_iter_combinations():
+    combinations = list(iter_combinations(range(4, 6)))
+    assert [n for n, *_ in combinations] == [4, 5]
+    assert [threat for *_, threat in combinations] == [False, True]
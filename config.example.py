@@ -8,8 +8,15 @@ FTP_USER = ""
 FTP_PASS = ""
 # If True, do not upload logs via FTP
 DONT_UPLOAD_LOGS = True
+# If True, upload what's new in each log as numbered gzip chunks instead
+LOG_CHUNKS = False
+# Ship log chunks to this local directory instead of the FTP server
+LOG_SINK_DIR = ""
 # The chance for the treat to become a threat
 THREAT_PROBABILITY = 1 / 100
+# Weights for --weighted, by entry text or id, e.g. {"treats": {"Cookies": 2}}
+# Entries not listed here are weighted by their engagement from --item-stats
+WEIGHTS = {}
 # Local directories for cache and logs
 LOCAL_CACHE_DIR = "cache"  # unused
 LOCAL_LOGS_DIR = "logs"  # unused
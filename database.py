@@ -0,0 +1,130 @@
+import logging
+import sqlite3
+from collections.abc import Iterable
+from datetime import datetime
+from statuses import annotate, engagement
+
+log = logging.getLogger(__name__)
+
+DATABASE_FILE = "statuses.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS statuses (
+    id INTEGER PRIMARY KEY,
+    created_at INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    content TEXT NOT NULL,
+    reblogs_count INTEGER NOT NULL,
+    favourites_count INTEGER NOT NULL,
+    replies_count INTEGER,
+    engagement INTEGER NOT NULL,
+    folx_id TEXT,
+    treat_id TEXT,
+    threat INTEGER
+);
+CREATE INDEX IF NOT EXISTS statuses_created_at ON statuses (created_at);
+CREATE INDEX IF NOT EXISTS statuses_engagement ON statuses (engagement);
+CREATE INDEX IF NOT EXISTS statuses_folx ON statuses (folx_id, engagement);
+CREATE INDEX IF NOT EXISTS statuses_treat ON statuses (treat_id, engagement);
+"""
+
+UPSERT = """
+INSERT INTO statuses VALUES (
+    :id, :created_at, :url, :content, :reblogs_count, :favourites_count,
+    :replies_count, :engagement, :folx_id, :treat_id, :threat
+)
+ON CONFLICT (id) DO UPDATE SET
+    reblogs_count = excluded.reblogs_count,
+    favourites_count = excluded.favourites_count,
+    replies_count = excluded.replies_count,
+    engagement = excluded.engagement,
+    folx_id = excluded.folx_id,
+    treat_id = excluded.treat_id,
+    threat = excluded.threat
+"""
+
+# Which column each kind of item is kept in
+ITEM_COLUMNS = {"folx": "folx_id", "treats": "treat_id"}
+
+
+def row(record: dict) -> dict:
+    """Get the database row for a cached status, working out its folx and treat"""
+    if "folx_id" not in record:
+        # Cached before statuses were annotated
+        record = annotate(record)
+    return {
+        "id": int(record["id"]),
+        "created_at": int(datetime.fromisoformat(record["timestamp"]).timestamp()),
+        "url": record["url"],
+        "content": record["content"],
+        "reblogs_count": record["reblogs_count"],
+        "favourites_count": record["favourites_count"],
+        "replies_count": record.get("replies_count"),
+        "engagement": engagement(record),
+        "folx_id": record["folx_id"],
+        "treat_id": record["treat_id"],
+        "threat": record["threat"],
+    }
+
+
+class StatusDatabase:
+    """An SQLite copy of the status store for asking questions of the bot's history
+
+    Statuses are upserted by id, so a crawl only writes what it fetched. There
+    are indexes on the posting time, the engagement (boosts plus favourites)
+    and the folx and treat each status used, so ranking queries don't have to
+    read every status.
+    """
+
+    def __init__(self, path: str = DATABASE_FILE) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> "StatusDatabase":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT count(*) FROM statuses").fetchone()[0]
+
+    def upsert(self, records: Iterable[dict]) -> int:
+        """Add or update cached statuses in one transaction, returning how many"""
+        with self.connection:
+            cursor = self.connection.executemany(UPSERT, map(row, records))
+        return cursor.rowcount
+
+    def top(self, count: int, since: datetime | None = None) -> list[sqlite3.Row]:
+        """Get the `count` most interacted with statuses, optionally only recent ones"""
+        return self.connection.execute(
+            "SELECT * FROM statuses WHERE created_at >= ?"
+            " ORDER BY engagement DESC, id DESC LIMIT ?",
+            (self.timestamp(since), count),
+        ).fetchall()
+
+    def top_items(
+        self, kind: str, count: int, since: datetime | None = None
+    ) -> list[sqlite3.Row]:
+        """Get the folx or treats with the most engagement in total
+
+        Each row has the item id, how many statuses used it, and their total
+        and mean engagement.
+        """
+        column = ITEM_COLUMNS[kind]
+        return self.connection.execute(
+            f"SELECT {column} AS item_id, count(*) AS statuses,"
+            " sum(engagement) AS engagement, avg(engagement) AS mean"
+            f" FROM statuses WHERE {column} IS NOT NULL AND created_at >= ?"
+            f" GROUP BY {column} ORDER BY engagement DESC, statuses LIMIT ?",
+            (self.timestamp(since), count),
+        ).fetchall()
+
+    @staticmethod
+    def timestamp(since: datetime | None) -> int:
+        return 0 if since is None else int(since.timestamp())
@@ -0,0 +1,58 @@
+from database import StatusDatabase
+from datetime import datetime, timezone
+from treats import FOLX_ITEMS, TREAT_ITEMS, render
+
+
+def record(status_id, folx, treat, boosts=0, when="2025-01-01T00:00:00+00:00"):
+    return {
+        "id": status_id,
+        "timestamp": when,
+        "url": f"https://example.com/{status_id}",
+        "content": f"<p>{render(FOLX_ITEMS[folx], TREAT_ITEMS[treat])}</p>",
+        "reblogs_count": boosts,
+        "favourites_count": 1,
+    }
+
+
+def test_upsert(tmp_path):
+    with StatusDatabase(str(tmp_path / "statuses.sqlite3")) as db:
+        db.upsert([record(1, 0, 0), record(2, 1, 1, boosts=5)])
+        db.upsert([record(1, 0, 0, boosts=9)])
+        assert len(db) == 2
+        assert [status["id"] for status in db.top(10)] == [1, 2]
+        assert db.top(1)[0]["engagement"] == 10
+        assert db.top(1)[0]["folx_id"] == FOLX_ITEMS[0].id
+        assert db.top(1)[0]["treat_id"] == TREAT_ITEMS[0].id
+
+
+def test_top_since(tmp_path):
+    with StatusDatabase(str(tmp_path / "statuses.sqlite3")) as db:
+        db.upsert(
+            [
+                record(1, 0, 0, boosts=9),
+                record(2, 1, 1, boosts=5, when="2025-02-01T00:00:00+00:00"),
+            ]
+        )
+        since = datetime(2025, 1, 15, tzinfo=timezone.utc)
+        assert [status["id"] for status in db.top(10, since)] == [2]
+
+
+def test_top_items(tmp_path):
+    with StatusDatabase(str(tmp_path / "statuses.sqlite3")) as db:
+        db.upsert(
+            [
+                record(1, 0, 0, boosts=1),
+                record(2, 0, 1, boosts=2),
+                record(3, 1, 1, boosts=5),
+                # Not something the bot says
+                {**record(4, 1, 1, boosts=100), "content": "<p>hello</p>"},
+            ]
+        )
+        folx = db.top_items("folx", 10)
+        assert [(item["item_id"], item["statuses"]) for item in folx] == [
+            (FOLX_ITEMS[1].id, 1),
+            (FOLX_ITEMS[0].id, 2),
+        ]
+        assert folx[1]["engagement"] == 5
+        treats = db.top_items("treats", 1)
+        assert treats[0]["item_id"] == TREAT_ITEMS[1].id
@@ -1,20 +1,76 @@
 import argparse
 import config
-import ftplib
-import hashlib
+import contextlib
+import copy
+import functools
+import io
 import json
 import logging
 import os
 import random
+import re
 import sys
+import threading
 import time
 from arrays import FOLX, TREATS
+from bloom import POSTED_FILE, ScalableBloomFilter
+from collections import Counter
+from collections.abc import Iterator
+from combinations import (
+    combination_index,
+    index_of,
+    iter_combinations,
+    nth_combination,
+    pair_items,
+    shard_range,
+)
 from datetime import datetime, timezone
 from enum import Enum
-from mastodon import Mastodon
+from state import STATE_FILE, UsedState
+from statuses import (
+    ITEM_STATS_FILE,
+    SCORES,
+    STORE_FILE,
+    StatusStore,
+    item_stats,
+    merge_records,
+    open_store,
+    status_record,
+    status_text,
+    top_statuses,
+)
+from treats import FOLX_ITEMS, TREAT_ITEMS, Item, render
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from mastodon import Mastodon
+    from shipping import Sink
+    from weights import AliasTable, AliasTables
 
 log = logging.getLogger(__name__)
 
+SCHEDULED_FILE = "scheduled.json"
+# Mastodon won't schedule a status less than 5 minutes ahead, or keep more than 300,
+# or more than 25 for any one day (UTC)
+MIN_SCHEDULE_AHEAD = 5 * 60
+MAX_SCHEDULED = 300
+MAX_SCHEDULED_PER_DAY = 25
+# The files ship_logs() uploads
+LOG_FILES = ["used_folx", "used_treats", "as-a-treat.log"]
+UPLOADED_FILE = "uploaded.json"
+# How many seconds each phase of a post should take. Past its budget a phase is
+# logged as slow, and the post and upload budgets are also their timeouts.
+PHASE_BUDGETS = {"pick": 2, "post": 30, "ship": 60}
+# How many times to re-draw a status that has been posted before, before
+# giving up and posting it anyway
+MAX_REDRAWS = 100
+# How long to trust the bot's account details before asking again
+ME_TTL = 5 * 60
+# Keep-alive connections to keep open, enough for the parallel status fetches
+POOL_SIZE = 16
+# Start pacing API calls once fewer than this many are left in the rate limit
+RATELIMIT_RESERVE = 30
+
 
 class Visibility(Enum):
     """The possible visibilities for a post according to the mastodon client"""
@@ -28,6 +84,48 @@ class Visibility(Enum):
         return self.value
 
 
+class Throttle:
+    """Paces API calls using the rate limit the instance reports
+
+    Mastodon.py keeps the X-RateLimit-Remaining and X-RateLimit-Reset headers
+    from the last response. While more than `reserve` calls are left this
+    doesn't wait at all. Below that, the calls that are left are spread evenly
+    over the time until the limit resets. Every API call, including each page
+    of a paginated one, should be preceded by wait().
+
+    Mastodon.py's own ratelimit_method="pace" isn't used because it spaces out
+    every call from the start, which slows a crawl down even while most of
+    the limit is left. It also doesn't log why it's waiting, and parallel
+    fetches would each work out their own pause from the same numbers. The
+    client is left on "wait", so a call made inside Mastodon.py that runs out
+    of the limit still sleeps until it resets rather than failing.
+    """
+
+    def __init__(self, reserve: int = RATELIMIT_RESERVE) -> None:
+        self.reserve = reserve
+        self.lock = threading.Lock()
+
+    def wait(self, mastodon: "Mastodon") -> None:
+        """Wait until it's OK to make another call"""
+        # Parallel fetches share the limit, so they take it in turns to wait
+        with self.lock:
+            remaining = mastodon.ratelimit_remaining
+            until_reset = mastodon.ratelimit_reset - time.time()
+            if remaining > self.reserve or until_reset <= 0:
+                return
+            delay = until_reset / remaining if remaining > 0 else until_reset
+            log.info(
+                "%d API calls left for the next %.0f seconds, waiting %.1f seconds",
+                remaining,
+                until_reset,
+                delay,
+            )
+            time.sleep(delay)
+
+
+throttle = Throttle()
+
+
 def get_log_level(no_log: bool, verbose: bool) -> int:
     if no_log:
         return logging.ERROR
@@ -47,6 +145,82 @@ def count_combinations() -> None:
     print(output)
 
 
+@functools.cache
+def mastodon_client() -> "Mastodon":
+    """Get the authenticated Mastodon client, creating it the first time
+
+    There's one client per process, so every command shares its keep-alive
+    connections. mastodon is imported here rather than at the top of the file
+    so offline commands like --count and --dry-run don't pay for importing it.
+    """
+    import requests
+    from mastodon import Mastodon
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return Mastodon(
+        access_token=config.ACCESS_TOKEN,
+        api_base_url=config.API_URL,
+        session=session,
+        request_timeout=PHASE_BUDGETS["post"],
+        ratelimit_method="wait",
+    )
+
+
+# The client the account was fetched with, when, and the account
+_me_cache: tuple | None = None
+
+
+def get_me(mastodon: "Mastodon"):
+    """Get the bot's own account, only asking the instance every ME_TTL seconds"""
+    global _me_cache
+    if (
+        _me_cache is None
+        or _me_cache[0] is not mastodon
+        or time.time() - _me_cache[1] > ME_TTL
+    ):
+        throttle.wait(mastodon)
+        _me_cache = (mastodon, time.time(), mastodon.me())
+    return _me_cache[2]
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse a shard given as I/N on the command line"""
+    try:
+        shard, shards = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected I/N, got {value!r}")
+    if not 0 <= shard < shards:
+        raise argparse.ArgumentTypeError("I must be at least 0 and less than N")
+    return shard, shards
+
+
+def enumerate_statuses(
+    shard: tuple[int, int] = (0, 1), output_format: str = "text"
+) -> None:
+    """Print every status the bot can make, or one shard of them"""
+    try:
+        for n, folx, treat, threat in iter_combinations(shard_range(*shard)):
+            status = render(folx, treat, threat)
+            if output_format == "jsonl":
+                record = {
+                    "n": n,
+                    "folx": folx.id,
+                    "treat": treat.id,
+                    "threat": threat,
+                    "status": status,
+                }
+                sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                sys.stdout.write(status + "\n")
+    except BrokenPipeError:
+        # The output was closed early (e.g. piped into head), stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
 def update_bio(dry_run: bool = False) -> None:
     """Update the bot's bio with the number of possible combinations"""
     num_folx = len(FOLX)
@@ -56,9 +230,8 @@ def update_bio(dry_run: bool = False) -> None:
     bio = f"You can have another bot, as a treat.\n\nI can choose from {num_folx} folx and {num_treats} treats, so there are {combinations:,} possible combinations.\n\nI last updated this bio on {last_update} (UTC)."
 
     if dry_run is False:
-        mastodon = Mastodon(
-            access_token=config.ACCESS_TOKEN, api_base_url=config.API_URL
-        )
+        mastodon = mastodon_client()
+        throttle.wait(mastodon)
         mastodon.account_update_credentials(note=bio)
         log.info("Updated bio to: %s", bio)
         print(f"Updated bio to: {bio}")
@@ -68,14 +241,17 @@ def update_bio(dry_run: bool = False) -> None:
 
 
 def write_status(
-    status: str, dry_run: bool = False, visibility: Visibility = Visibility("unlisted")
+    status: str,
+    dry_run: bool = False,
+    visibility: Visibility = Visibility("unlisted"),
+    mastodon: "Mastodon | None" = None,
 ) -> None:
-    """Write a status to Mastodon"""
+    """Write a status to Mastodon, reusing the given client if there is one"""
     if dry_run is False:
         # Post
-        mastodon = Mastodon(
-            access_token=config.ACCESS_TOKEN, api_base_url=config.API_URL
-        )
+        if mastodon is None:
+            mastodon = mastodon_client()
+        throttle.wait(mastodon)
         mastodon.status_post(status=status, visibility=str(visibility))
         log.info('Posted: "%s"', status)
         print(f"Posted: {status}")
@@ -84,17 +260,22 @@ def write_status(
         log.info('Dry run: would have posted "%s"', status)
 
 
-def should_be_threat():
-    """Use config.THREAT_PROBABILITY to determine if this treat should be a threat"""
+def threat_odds() -> int:
+    """Use config.THREAT_PROBABILITY to get the N in the 1 in N chance of a threat"""
     # TODO: Remove this check once enough time has passed since adding THREAT_PROBABILITY to config
     if not hasattr(config, "THREAT_PROBABILITY"):
         # Warn in the logs and on the console
         log.warning("THREAT_PROBABILITY is not present in config, using old default")
         print("Warning: THREAT_PROBABILITY is not present in config, using old default")
         # Use old default of '1 / 100'
-        range_max = int(1 / (1 / 100))
+        return int(1 / (1 / 100))
     else:
-        range_max = int(1 / config.THREAT_PROBABILITY)
+        return int(1 / config.THREAT_PROBABILITY)
+
+
+def should_be_threat():
+    """Use config.THREAT_PROBABILITY to determine if this treat should be a threat"""
+    range_max = threat_odds()
     chosen_value = random.randint(1, range_max)
     log.debug("Treat/Threat value %d (threat requires %d)", chosen_value, range_max)
 
@@ -113,14 +294,14 @@ def get_used_filename(thing: str) -> str:
 
 
 def save_used(thing: str, value: str) -> None:
-    """Add an entry to the used _things_ list"""
+    """Add an entry to the human-readable used _things_ log"""
     filename = get_used_filename(thing)
     with open(filename, "a") as f:
         f.write(value + "\n")
 
 
 def get_used(thing: str) -> list[str]:
-    """Get the list of used _things_"""
+    """Get the entries in the used _things_ log"""
     filename = get_used_filename(thing)
     if os.path.isfile(filename):
         with open(filename, "r") as f:
@@ -129,145 +310,960 @@ def get_used(thing: str) -> list[str]:
         return []
 
 
+def write_used(thing: str, values: list[str]) -> None:
+    """Replace the used _things_ log in one go"""
+    filename = get_used_filename(thing)
+    with open(filename + ".tmp", "w") as f:
+        f.writelines(value + "\n" for value in values)
+    os.replace(filename + ".tmp", filename)
+
+
 def clear_used(thing: str) -> None:
-    """Clear the list of used _things_"""
+    """Clear the used _things_ log"""
     filename = get_used_filename(thing)
     with open(filename, "w") as f:
         f.write("")
     log.info("Cleared used %s list", thing)
 
 
-def upload_logs(filename: str) -> None:
-    """Upload a file to the FTP server"""
-    # Check if filename exists
-    if not os.path.isfile(filename):
-        log.error(f"File {filename} does not exist")
-        return
-    session = ftplib.FTP(config.FTP_HOST, config.FTP_USER, config.FTP_PASS)
-    ftplib.FTP.cwd(session, "as-a-treat")
-    file = open(filename, "rb")
-    session.storbinary(f"STOR {filename}", file)
-    file.close()
-    session.quit()
-    log.info(f"Uploaded {filename}")
+def load_used_state() -> UsedState:
+    """Load which folx and treats have been used
+
+    The used_* files are only a log now, but if there's no state file yet they
+    are read once so the current cycle carries on where it left off.
+    """
+    lists = {"folx": FOLX_ITEMS, "treats": TREAT_ITEMS}
+    if os.path.isfile(STATE_FILE):
+        return UsedState.load(STATE_FILE, lists)
+
+    state = UsedState(lists)
+    for thing, items in lists.items():
+        positions = {item.entry: index for index, item in enumerate(items)}
+        for entry in get_used(thing):
+            if entry in positions:
+                state[thing].add(positions[entry])
+    log.info("Created %s from the used_* files", STATE_FILE)
+    return state
+
+
+def load_uploaded() -> dict[str, dict]:
+    """Get how much of each log the FTP server has, as far as we know"""
+    if not os.path.isfile(UPLOADED_FILE):
+        return {}
+    with open(UPLOADED_FILE, "r") as f:
+        return json.load(f)
+
 
+def save_uploaded(uploaded: dict[str, dict]) -> None:
+    with open(UPLOADED_FILE + ".tmp", "w") as f:
+        json.dump(uploaded, f)
+    os.replace(UPLOADED_FILE + ".tmp", UPLOADED_FILE)
 
-def get_status_count(mastodon: Mastodon) -> int:
+
+def upload_logs(filenames: list[str]) -> None:
+    """Upload files to the FTP server over one session, sending only what's new
+
+    For each file, the size the server has and the bytes just before that
+    point are kept in UPLOADED_FILE. If the file still starts with what was
+    sent, only what the server doesn't have yet is sent, with APPE. That's
+    usually the new tail, but it also picks up an upload that was cut off
+    part way, as the offset is recorded before sending and the server's
+    size is somewhere past it. Otherwise (the file was cleared or
+    rewritten, or the server copy changed) the whole file is sent again.
+    """
+    import ftplib
+    from shipping import read_check
+
+    uploaded = load_uploaded()
+    session = ftplib.FTP(
+        config.FTP_HOST,
+        config.FTP_USER,
+        config.FTP_PASS,
+        timeout=PHASE_BUDGETS["ship"],
+    )
+    try:
+        session.cwd("as-a-treat")
+        # SIZE needs binary mode to give byte counts
+        session.voidcmd("TYPE I")
+        for filename in filenames:
+            if not os.path.isfile(filename):
+                log.error(f"File {filename} does not exist")
+                continue
+            with open(filename, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                saved = uploaded.get(filename)
+                offset = 0
+                if saved is not None and saved["size"] <= size:
+                    check = read_check(f, saved["size"])
+                    try:
+                        remote_size = session.size(filename)
+                    except ftplib.error_perm:
+                        remote_size = None
+                    if (
+                        check.hex() == saved["check"]
+                        and remote_size is not None
+                        and saved["size"] <= remote_size <= size
+                    ):
+                        offset = remote_size
+                check = read_check(f, size)
+                if offset == size:
+                    log.debug(f"{filename} is already up to date")
+                    if saved is not None and saved["size"] != size:
+                        # The last upload got to the end, but was cut off
+                        # before it could be recorded
+                        uploaded[filename] = {"size": size, "check": check.hex()}
+                        save_uploaded(uploaded)
+                    continue
+                # Recorded first, so an upload that's cut off can resume
+                base = read_check(f, offset)
+                uploaded[filename] = {"size": offset, "check": base.hex()}
+                save_uploaded(uploaded)
+                # Only send up to the size seen now, even if the file grows
+                f.seek(offset)
+                data = io.BytesIO(f.read(size - offset))
+
+            if offset:
+                session.storbinary(f"APPE {filename}", data)
+                log.info(f"Uploaded {size - offset} new bytes of {filename}")
+            else:
+                session.storbinary(f"STOR {filename}", data)
+                log.info(f"Uploaded {filename}")
+            uploaded[filename] = {"size": size, "check": check.hex()}
+            save_uploaded(uploaded)
+    finally:
+        session.quit()
+
+
+def parse_duration(value: str) -> float:
+    """Parse a duration like 3600, 90m, 12h or 1d12h into seconds"""
+    units = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+    if value.isdigit():
+        return float(value)
+    if not re.fullmatch(r"(\d+[smhdw])+", value):
+        raise argparse.ArgumentTypeError(f"invalid duration: {value!r}")
+    return float(
+        sum(
+            int(number) * units[unit]
+            for number, unit in re.findall(r"(\d+)([smhdw])", value)
+        )
+    )
+
+
+def load_scheduled() -> list[dict]:
+    """Get the statuses this bot has scheduled, according to the local file"""
+    if not os.path.isfile(SCHEDULED_FILE):
+        return []
+    with open(SCHEDULED_FILE, "r") as f:
+        return json.load(f)
+
+
+def save_scheduled(scheduled: list[dict]) -> None:
+    """Save the list of scheduled statuses"""
+    with open(SCHEDULED_FILE + ".tmp", "w") as f:
+        f.write(json.dumps(scheduled, indent=4, ensure_ascii=False))
+    os.replace(SCHEDULED_FILE + ".tmp", SCHEDULED_FILE)
+
+
+def schedule_ahead(
+    duration: float,
+    interval: float,
+    dry_run: bool = False,
+    visibility: Visibility = Visibility("unlisted"),
+    combination_cycle: bool = False,
+    weighted: bool = False,
+) -> None:
+    """Schedule statuses every `interval` seconds to cover the next `duration` seconds
+
+    What has been queued is kept in scheduled.json, so running this again only
+    tops up the gap after the last scheduled status. Unless it's a dry run, the
+    list is checked against the instance first, so statuses that have been
+    published or deleted are forgotten. Days that already have
+    MAX_SCHEDULED_PER_DAY statuses queued are skipped.
+    """
+    now = datetime.now(timezone.utc)
+    scheduled = [
+        entry
+        for entry in load_scheduled()
+        if datetime.fromisoformat(entry["scheduled_at"]) > now
+    ]
+
+    mastodon = None
+    if dry_run is False:
+        mastodon = mastodon_client()
+        throttle.wait(mastodon)
+        page = mastodon.scheduled_statuses(limit=40)
+        queued = []
+        while page:
+            queued.extend(page)
+            throttle.wait(mastodon)
+            page = mastodon.fetch_next(page)
+        queued_ids = {str(status.id) for status in queued}
+        scheduled = [entry for entry in scheduled if entry["id"] in queued_ids]
+        room = MAX_SCHEDULED - len(queued)
+        per_day = Counter(
+            status.scheduled_at.astimezone(timezone.utc).date() for status in queued
+        )
+    else:
+        room = MAX_SCHEDULED - len(scheduled)
+        per_day = Counter(
+            datetime.fromisoformat(entry["scheduled_at"]).date() for entry in scheduled
+        )
+
+    earliest = int(now.timestamp()) + MIN_SCHEDULE_AHEAD + 60
+    if scheduled:
+        last = max(datetime.fromisoformat(e["scheduled_at"]) for e in scheduled)
+        slot = max(last.timestamp() + interval, earliest)
+    else:
+        slot = earliest
+    end = now.timestamp() + duration
+
+    # A dry run picks from a copy, so the preview doesn't use anything up
+    state = load_used_state()
+    if dry_run:
+        state = copy.deepcopy(state)
+    posted = load_posted()
+    weights = alias_tables(state) if weighted else None
+    added = 0
+    while slot <= end:
+        if added >= room:
+            log.warning("Hit the limit of %d scheduled statuses", MAX_SCHEDULED)
+            print(f"Stopping, the instance won't keep more than {MAX_SCHEDULED}")
+            break
+        when = datetime.fromtimestamp(slot, timezone.utc)
+        if per_day[when.date()] >= MAX_SCHEDULED_PER_DAY:
+            log.debug("%s already has %d scheduled", when.date(), per_day[when.date()])
+            slot += interval
+            continue
+        tables = weights.get() if weights is not None else None
+        folx, treat, status = draw_status(state, combination_cycle, tables, posted)
+        if mastodon is None:
+            print(f'Dry run: would have scheduled "{status}" for {when.isoformat()}')
+            log.info('Dry run: would have scheduled "%s" for %s', status, when)
+        else:
+            throttle.wait(mastodon)
+            result = mastodon.status_post(
+                status=status,
+                visibility=str(visibility),
+                scheduled_at=when,
+                idempotency_key=f"as-a-treat-{int(slot)}",
+            )
+            scheduled.append(
+                {
+                    "id": str(result.id),
+                    "scheduled_at": when.isoformat(),
+                    "status": status,
+                }
+            )
+            # Save as we go, so a failure part way through doesn't lose track,
+            # and only once it's queued, so a failed post doesn't use anything up
+            save_scheduled(scheduled)
+            commit_pick(state, folx, treat, combination_cycle)
+            remember_posted(posted, status)
+            log.info('Scheduled "%s" for %s', status, when)
+            print(f"Scheduled for {when.isoformat()}: {status}")
+        per_day[when.date()] += 1
+        added += 1
+        slot += interval
+
+    print(f"Scheduled {added} new statuses")
+
+
+def get_status_count(mastodon: "Mastodon") -> int:
     """Get the total number of statuses posted by the bot"""
-    account = mastodon.me()
+    account = get_me(mastodon)
     return account.statuses_count
 
 
-def most_interacted(over_count: int = 400, cache: bool = True) -> None:
-    """Find the most interacted with post and save a link to a file"""
-    mastodon = Mastodon(access_token=config.ACCESS_TOKEN, api_base_url=config.API_URL)
-    start_time = time.time()
-    total_statuses = get_status_count(mastodon)
-    print(f"Total statuses: {total_statuses}")
-    target_count = over_count
-    print(f"Fetching about the last {target_count} statuses...")
-    statuses = mastodon.account_statuses(
-        id=mastodon.me().id,
+def crawl_statuses(mastodon: "Mastodon", **kwargs) -> Iterator[list]:
+    """Yield pages of the bot's own statuses, newest first
+
+    Any extra arguments (e.g. max_id) are passed on to account_statuses.
+    """
+    throttle.wait(mastodon)
+    page = mastodon.account_statuses(
+        id=get_me(mastodon).id,
         exclude_replies=True,
         exclude_reblogs=True,
         limit=40,
+        **kwargs,
+    )
+    while page:
+        yield page
+        throttle.wait(mastodon)
+        page = mastodon.fetch_next(page)
+
+
+def fetch_statuses(mastodon: "Mastodon", target_count: int) -> list[dict]:
+    """Fetch about the last `target_count` statuses"""
+    print(f"Fetching about the last {target_count} statuses...")
+    records: list[dict] = []
+    for page in crawl_statuses(mastodon):
+        records.extend(status_record(status) for status in page)
+        if len(records) >= target_count:
+            break
+        print(f"Fetched {len(records)} statuses so far...")
+    return records
+
+
+def snowflake_id(when: float) -> int:
+    """Get the lowest Mastodon status id for a time
+
+    Mastodon ids are a millisecond timestamp shifted left 16 bits, with a
+    sequence number in the low bits.
+    """
+    return int(when * 1000) << 16
+
+
+def fetch_range(mastodon: "Mastodon", since_id: int, max_id: int) -> list[dict]:
+    """Fetch all the bot's statuses with since_id < id < max_id, newest first"""
+    account_id = get_me(mastodon).id
+    records: list[dict] = []
+    while True:
+        throttle.wait(mastodon)
+        page = mastodon.account_statuses(
+            id=account_id,
+            exclude_replies=True,
+            exclude_reblogs=True,
+            limit=40,
+            max_id=max_id,
+            since_id=since_id,
+        )
+        if not page:
+            return records
+        records.extend(status_record(status) for status in page)
+        max_id = page[-1].id
+
+
+def fetch_statuses_parallel(
+    mastodon: "Mastodon", target_count: int, concurrency: int
+) -> list[dict]:
+    """Fetch about the last `target_count` statuses, several pages at a time
+
+    The statuses fetched so far are used to estimate how far back
+    `target_count` statuses go. That stretch of time is split into
+    `concurrency` id ranges which are fetched at the same time, and this
+    repeats until there are enough. If a round finds nothing, the rest is
+    fetched one page at a time from the oldest status found.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    print(
+        f"Fetching about the last {target_count} statuses, {concurrency} at a time..."
     )
-    all_statuses: list = []
-    while statuses and len(all_statuses) < target_count:
-        all_statuses.extend(statuses)
-        if len(all_statuses) >= target_count:
+    first = next(crawl_statuses(mastodon), [])
+    records = [status_record(status) for status in first]
+    if len(first) < 2 or len(records) >= target_count:
+        return records[:target_count]
+    if (
+        abs((int(first[-1].id) >> 16) - first[-1].created_at.timestamp() * 1000)
+        > 60 * 1000
+    ):
+        log.warning("Status ids aren't timestamps, fetching one page at a time")
+        return fetch_statuses(mastodon, target_count)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while len(records) < target_count:
+            newest = datetime.fromisoformat(records[0]["timestamp"]).timestamp()
+            oldest = datetime.fromisoformat(records[-1]["timestamp"]).timestamp()
+            # Aim a little further back than needed, so one round is usually enough
+            per_status = (newest - oldest) / (len(records) - 1)
+            start = oldest - per_status * (target_count - len(records)) * 1.2
+            bounds = [
+                snowflake_id(start + (oldest - start) * i / concurrency)
+                for i in range(concurrency)
+            ]
+            bounds.append(int(records[-1]["id"]))
+            # Each range starts just below the end of the next one, so a status
+            # right on a boundary can't be missed. merge_records() drops the
+            # duplicates.
+            ranges = [(bounds[i] - 1, bounds[i + 1]) for i in range(concurrency)]
+            parts = pool.map(lambda bound: fetch_range(mastodon, *bound), ranges)
+            fetched = [record for part in parts for record in part]
+            if not fetched:
+                break
+            records = merge_records(records, fetched)
+            print(f"Fetched {len(records)} statuses so far...")
+
+    if len(records) < target_count:
+        print("Fetching the rest one page at a time...")
+        older: list[dict] = []
+        for page in crawl_statuses(mastodon, max_id=records[-1]["id"]):
+            older.extend(status_record(status) for status in page)
+            if len(records) + len(older) >= target_count:
+                break
+        records = merge_records(records, older)
+    return records[:target_count]
+
+
+def update_statuses(
+    mastodon: "Mastodon", store: StatusStore, target_count: int, refresh_window: int
+) -> None:
+    """Bring the status store up to date without fetching everything again
+
+    Statuses newer than the store are fetched, along with at least the newest
+    `refresh_window` statuses so their boost and favourite counts are fresh.
+    Older statuses are only fetched if the store has fewer than `target_count`.
+    """
+    newest_id = store.newest_id()
+    print(f"Fetching statuses newer than {newest_id}...")
+    fetched: list[dict] = []
+    for page in crawl_statuses(mastodon):
+        fetched.extend(status_record(status) for status in page)
+        if int(page[-1].id) <= newest_id and len(fetched) >= refresh_window:
             break
-        print(f"Fetched {len(all_statuses)} statuses so far...")
-        statuses = mastodon.fetch_next(statuses)
-        # Be nice to the server
-        if len(all_statuses) % 400 == 0:
-            print("Sleeping for 1 second to be nice to the server...")
-            time.sleep(1)
-
-    if not all_statuses:
+    changed = store.update(fetched)
+    print(f"Fetched {len(fetched)} recent statuses, {changed} new or changed")
+
+    if len(store) < target_count:
+        print(f"Fetching older statuses to reach {target_count}...")
+        older: list[dict] = []
+        for page in crawl_statuses(mastodon, max_id=store.oldest_id()):
+            older.extend(status_record(status) for status in page)
+            if len(store) + len(older) >= target_count:
+                break
+        store.update(older)
+
+
+def most_interacted(
+    over_count: int = 400,
+    cache: bool = True,
+    incremental: bool = False,
+    refresh_window: int = 200,
+    concurrency: int = 1,
+    top: int = 1,
+    score: str = "engagement",
+    database: bool = False,
+) -> None:
+    """Find the most interacted with post and save a link to a file
+
+    Fetched statuses are added to the status store. With `incremental`, the
+    statuses already in the store are reused and only what has changed since
+    is fetched (see update_statuses()). The `top` best statuses by the `score`
+    function (see statuses.SCORES) are saved, best first, under "ranking".
+    With `database`, the fetched statuses are upserted into the SQLite status
+    database too (see query_database()).
+    """
+    mastodon = mastodon_client()
+    start_time = time.time()
+    total_statuses = get_status_count(mastodon)
+    print(f"Total statuses: {total_statuses}")
+    store = open_store() if cache or incremental else None
+    if incremental and store is not None and len(store) > 0:
+        update_statuses(mastodon, store, over_count, refresh_window)
+        searched = list(store.newest(over_count))
+        fetched = searched
+    else:
+        if concurrency > 1:
+            fetched = fetch_statuses_parallel(mastodon, over_count, concurrency)
+        else:
+            fetched = fetch_statuses(mastodon, over_count)
+        searched = fetched[:over_count]
+        if store is not None:
+            store.update(fetched)
+
+    if not searched:
         print("No statuses found")
         return
-    print(f"Fetched {len(all_statuses)} statuses and stopping")
+    print(f"Fetched {len(searched)} statuses and stopping")
 
-    most_interacted_status = max(
-        all_statuses,
-        key=lambda status: status.reblogs_count + status.favourites_count,
-    )
-    link = most_interacted_status.url
+    if database:
+        from database import StatusDatabase
+
+        with StatusDatabase() as db:
+            if len(db) == 0 and store is not None:
+                # Start the database off with everything already cached
+                db.upsert(store.newest())
+            db.upsert(fetched)
+            print(f"Saved {len(db)} statuses to {db.path}")
+
+    ranking = top_statuses(searched, top, SCORES[score])
+    most_interacted_status = ranking[0][1]
+    link = most_interacted_status["url"]
     end_time = time.time()
 
-    if cache:
-        cache_content: dict = {
+    if store is not None:
+        header = {
             "timestamp": datetime.now(timezone.utc).isoformat(),
-            "account_id": mastodon.me().id,
-            "account_username": mastodon.me().username,
-            "statuses_searched": len(all_statuses),
+            "account_id": get_me(mastodon).id,
+            "account_username": get_me(mastodon).username,
+            "statuses_searched": len(searched),
             "account_total_statuses": total_statuses,
-            "most_interacted_status_in_batch": {
-                "id": most_interacted_status.id,
-                "timestamp": most_interacted_status.created_at.isoformat(),
-                "url": most_interacted_status.url,
-                "content": most_interacted_status.content,
-                "reblogs_count": most_interacted_status.reblogs_count,
-                "favourites_count": most_interacted_status.favourites_count,
-            },
-            "newest_status_id": all_statuses[0].id,
-            "oldest_status_id": all_statuses[-1].id,
+            "most_interacted_status_in_batch": most_interacted_status,
+            "newest_status_id": store.newest_id(),
+            "oldest_status_id": store.oldest_id(),
             "time_taken_seconds": f"{end_time - start_time:.2f}",
-            "statuses_count": len(all_statuses),
-            "statuses_hash": None,
-            "statuses": [],
+            "statuses_count": len(store),
         }
-        for status in all_statuses:
-            cache_content["statuses"].append(
-                {
-                    "id": status.id,
-                    "timestamp": status.created_at.isoformat(),
-                    "url": status.url,
-                    "content": status.content,
-                    "reblogs_count": status.reblogs_count,
-                    "favourites_count": status.favourites_count,
-                }
-            )
-        # Generate a hash of cache_content["statuses"] for cache key
-        hasher = hashlib.sha256()
-        hasher.update(json.dumps(cache_content["statuses"], sort_keys=True).encode())
-        cache_content["statuses_hash"] = hasher.hexdigest()
-
-        cache_content = {**cache_content}
+        store.save(header)
+        print(f"Saved {len(store)} statuses to {store.path}")
 
-        # If the cache file exists, copy it to a backup
-        if os.path.isfile("statuses_cache.json"):
-            os.rename("statuses_cache.json", "statuses_cache.backup.json")
-
-        # Write the cache to a file
-        with open("statuses_cache.json", "w") as f:
-            f.write(json.dumps(cache_content, indent=4))
-        print("Wrote cache to statuses_cache.json")
-
-    print(
-        f"Checked {len(all_statuses)} statuses in {end_time - start_time:.2f} seconds"
-    )
+    print(f"Checked {len(searched)} statuses in {end_time - start_time:.2f} seconds")
     print(f"Most interacted post: {link}")
     print(
-        f"Boosts: {most_interacted_status.reblogs_count}, Favourites: {most_interacted_status.favourites_count}"
+        f"Boosts: {most_interacted_status['reblogs_count']}, Favourites: {most_interacted_status['favourites_count']}"
     )
     result = {
         "timestamp": datetime.now(timezone.utc).isoformat(),
-        "id": most_interacted_status.id,
-        "post_timestamp": most_interacted_status.created_at.isoformat(),
-        "url": most_interacted_status.url,
-        "content": most_interacted_status.content,
-        "reblogs_count": most_interacted_status.reblogs_count,
-        "favourites_count": most_interacted_status.favourites_count,
-        "statuses_searched": len(all_statuses),
+        "id": most_interacted_status["id"],
+        "post_timestamp": most_interacted_status["timestamp"],
+        "url": most_interacted_status["url"],
+        "content": most_interacted_status["content"],
+        "reblogs_count": most_interacted_status["reblogs_count"],
+        "favourites_count": most_interacted_status["favourites_count"],
+        "statuses_searched": len(searched),
         "account_total_statuses": total_statuses,
+        "score": score,
+        "ranking": [
+            {
+                "rank": rank,
+                "score": value,
+                "id": status["id"],
+                "post_timestamp": status["timestamp"],
+                "url": status["url"],
+                "content": status["content"],
+                "reblogs_count": status["reblogs_count"],
+                "favourites_count": status["favourites_count"],
+                "replies_count": status.get("replies_count"),
+            }
+            for rank, (value, status) in enumerate(ranking, start=1)
+        ],
     }
+    if top > 1:
+        print(f"Top {len(ranking)} by {score}:")
+        for rank, (value, status) in enumerate(ranking, start=1):
+            print(f"{rank:>4}. {value:g} {status['url']}")
     with open("most_interacted.json", "w") as f:
         f.write(json.dumps(result, indent=4))
     log.info("Most interacted post: %s", link)
 
 
+def write_item_stats() -> None:
+    """Summarize the engagement of every folx and treat from the status store
+
+    The summary is saved to ITEM_STATS_FILE, and the entries that have never
+    been posted are counted, since they're the ones to look at when pruning
+    arrays.py.
+    """
+    store = open_store()
+    stats = item_stats(store.newest())
+    data = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "statuses": len(store),
+        **stats,
+    }
+    with open(ITEM_STATS_FILE + ".tmp", "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(ITEM_STATS_FILE + ".tmp", ITEM_STATS_FILE)
+
+    print(f"Summarized {len(store)} statuses to {ITEM_STATS_FILE}")
+    for kind, items in stats.items():
+        unused = sum(1 for item in items.values() if item["count"] == 0)
+        print(f"{unused} of {len(items)} {kind} have never been posted")
+
+
+def query_database(kind: str, limit: int, since: float | None = None) -> None:
+    """Print the best statuses, folx or treats from the SQLite status database
+
+    `since` is a number of seconds, to only count statuses posted that
+    recently.
+    """
+    from database import StatusDatabase
+
+    start = None
+    if since is not None:
+        start = datetime.fromtimestamp(time.time() - since, timezone.utc)
+    with StatusDatabase() as db:
+        if kind == "statuses":
+            for rank, status in enumerate(db.top(limit, start), start=1):
+                print(f"{rank:>4}. {status['engagement']} {status['url']}")
+            return
+
+        items = FOLX_ITEMS if kind == "folx" else TREAT_ITEMS
+        text = {item.id: item.text for item in items}
+        for rank, item in enumerate(db.top_items(kind, limit, start), start=1):
+            print(
+                f"{rank:>4}. {item['engagement']} over {item['statuses']} statuses"
+                f" ({item['mean']:.1f} each) {text.get(item['item_id'], '(removed)')}"
+            )
+
+
+def draw_item(state: UsedState, thing: str, table: "AliasTable | None" = None) -> int:
+    """Draw the position of the next _thing_ from its bag, starting a new cycle if needed
+
+    With an alias `table`, the draw is weighted instead, though still only
+    from the items that haven't been used this cycle. Only the state in
+    memory changes, see commit_pick().
+    """
+    bag = state[thing]
+    log.debug("%d unused %s remaining", bag.size - len(bag), thing)
+    if bag.is_full():
+        bag.reshuffle()
+    if table is None:
+        return bag.next()
+    from weights import draw_unused
+
+    return draw_unused(bag, table)
+
+
+def draw_pair(
+    state: UsedState, tables: "dict[str, AliasTable] | None" = None
+) -> tuple[int, int]:
+    """Draw the positions of a folx and a treat from their bags"""
+    tables = tables or {}
+    return (
+        draw_item(state, "folx", tables.get("folx")),
+        draw_item(state, "treats", tables.get("treats")),
+    )
+
+
+def commit_pick(
+    state: UsedState, folx: Item, treat: Item, combination_cycle: bool = False
+) -> None:
+    """Save the state and add the folx and treat to the human-readable used logs"""
+    state.save(STATE_FILE)
+    for thing, item in (("folx", folx), ("treats", treat)):
+        # The logs follow the bags, so they start again with each new cycle
+        if not combination_cycle and len(state[thing]) == 1:
+            clear_used(thing)
+        save_used(thing, item.entry)
+
+
+def alias_tables(state: UsedState) -> "AliasTables":
+    """Set up the alias tables for --weighted, to be passed to each pick"""
+    from weights import AliasTables
+
+    return AliasTables(state.lists, getattr(config, "WEIGHTS", {}))
+
+
+def draw_status(
+    state: UsedState,
+    combination_cycle: bool = False,
+    tables: "dict[str, AliasTable] | None" = None,
+    posted: ScalableBloomFilter | None = None,
+) -> tuple[Item, Item, str]:
+    """Draw an unused folx and treat and render the status text, without saving
+
+    Only the state in memory changes, see commit_pick() for the rest.
+
+    With `combination_cycle`, the pair comes from a walk through every folx
+    and treat combination instead of from the separate folx and treat bags,
+    so the exact same pair can't come up again until all of them have, or
+    arrays.py changes.
+
+    With alias `tables` (see alias_tables()), items with more weight (see
+    weights.item_weights()) tend to come up earlier in each cycle.
+
+    With a `posted` filter (see load_posted()), a status that has been posted
+    before is drawn again, up to MAX_REDRAWS times. A rejected folx and treat
+    go back into the unused part of their bags, so only the pair that is
+    posted gets used up. A rejected combination is skipped, as it was posted
+    in an earlier cycle anyway.
+    """
+    previous: tuple[int, int] | None = None
+    redraws = 0
+    while True:
+        if combination_cycle:
+            pair = state.combinations.next()
+            log.debug(
+                "Combination %d (%d of this cycle)", pair, state.combinations.counter
+            )
+            folx, treat = pair_items(pair)
+        else:
+            drawn = draw_pair(state, tables)
+            if previous is not None:
+                # Drawn before putting the old ones back, so they can't come
+                # straight back
+                for thing, old, new in zip(("folx", "treats"), previous, drawn):
+                    if old != new:
+                        state[thing].put_back(old)
+            previous = drawn
+            folx = state.lists["folx"][drawn[0]]
+            treat = state.lists["treats"][drawn[1]]
+        status = render(folx, treat, should_be_threat())
+        if posted is None or status not in posted:
+            break
+        if redraws == MAX_REDRAWS:
+            log.warning("Couldn't find a status that hasn't been posted")
+            break
+        redraws += 1
+        log.info('Already posted "%s", drawing again', status)
+    if treat.alt_wording:
+        log.debug('Using alternate wording for treat: "%s"', treat.text)
+    log.debug('Picked folx "%s" and treat "%s"', folx.text, treat.text)
+    return folx, treat, status
+
+
+def pick_status(
+    state: UsedState,
+    combination_cycle: bool = False,
+    tables: "dict[str, AliasTable] | None" = None,
+    posted: ScalableBloomFilter | None = None,
+    commit: bool = True,
+) -> str:
+    """Pick an unused folx and treat, mark them as used and return the status text
+
+    See draw_status() for the options. The state is updated in place and,
+    with `commit`, saved along with the used logs, so a long-running process
+    can keep passing the same state in without re-reading it.
+    """
+    folx, treat, status = draw_status(state, combination_cycle, tables, posted)
+    if commit:
+        commit_pick(state, folx, treat, combination_cycle)
+    return status
+
+
+def load_posted() -> ScalableBloomFilter:
+    """Load the filter of statuses posted before
+
+    The first time, it's filled in from the status store, so statuses posted
+    before the filter existed are remembered too.
+    """
+    if os.path.isfile(POSTED_FILE):
+        return ScalableBloomFilter.load(POSTED_FILE)
+    posted = ScalableBloomFilter()
+    if os.path.isfile(STORE_FILE):
+        for record in StatusStore().newest():
+            posted.add(status_text(record))
+        log.info("Filled the posted filter with %d cached statuses", len(posted))
+    return posted
+
+
+def remember_posted(posted: ScalableBloomFilter, status: str) -> None:
+    """Add a status to the filter of statuses posted before and save it"""
+    posted.add(status)
+    posted.save(POSTED_FILE)
+
+
+def pick_batch(
+    state: UsedState, count: int, combination_cycle: bool = False
+) -> list[int]:
+    """Draw `count` statuses at once, returning their combination numbers
+
+    The folx and treat positions are sliced straight out of the bags (or the
+    combination cycle) and the threat rolls are done up front, so this is much
+    cheaper than calling pick_status() `count` times. The state is updated in
+    place but not saved.
+    """
+    if combination_cycle:
+        pairs = [state.combinations.next() for _ in range(count)]
+        folx = [pair // len(TREAT_ITEMS) for pair in pairs]
+        treats = [pair % len(TREAT_ITEMS) for pair in pairs]
+    else:
+        folx = state["folx"].take(count)
+        treats = state["treats"].take(count)
+    range_max = threat_odds()
+    threats = [random.randint(1, range_max) == range_max for _ in range(count)]
+    return [combination_index(*pick) for pick in zip(folx, treats, threats)]
+
+
+def batch(count: int, combination_cycle: bool = False, commit: bool = False) -> None:
+    """Print `count` statuses as JSON lines, optionally marking them as used
+
+    Without `commit` the picks are made on a copy of the state, so nothing is
+    used up. With it, the state file and used logs are only written once all
+    the picks have been made.
+    """
+    state = load_used_state()
+    working = state if commit else copy.deepcopy(state)
+    numbers = pick_batch(working, count, combination_cycle)
+
+    for n in numbers:
+        folx, treat, threat = nth_combination(n)
+        record = {
+            "n": n,
+            "folx": folx.id,
+            "treat": treat.id,
+            "threat": threat,
+            "status": render(folx, treat, threat),
+        }
+        print(json.dumps(record, ensure_ascii=False))
+
+    if commit:
+        working.save(STATE_FILE)
+        if combination_cycle:
+            for n in numbers:
+                folx, treat, _ = nth_combination(n)
+                save_used("folx", folx.entry)
+                save_used("treats", treat.entry)
+        else:
+            # The bags may have started a new cycle, so rebuild the logs
+            for thing, items in working.lists.items():
+                bag = working[thing]
+                write_used(thing, [items[i].entry for i in bag.order[: bag.cursor]])
+        log.info("Marked %d batch picks as used", count)
+
+
+def log_sink() -> "Sink":
+    """Get where log chunks go, config.LOG_SINK_DIR if it's set or the FTP server"""
+    from shipping import FTPSink, LocalSink
+
+    directory = getattr(config, "LOG_SINK_DIR", "")
+    if directory:
+        return LocalSink(directory)
+    return FTPSink(
+        config.FTP_HOST,
+        config.FTP_USER,
+        config.FTP_PASS,
+        "as-a-treat",
+        timeout=PHASE_BUDGETS["ship"],
+    )
+
+
+def ship_logs() -> None:
+    """Upload the used lists and the log file, unless DONT_UPLOAD_LOGS is set
+
+    With config.LOG_CHUNKS, what's been added to each file is shipped as a
+    numbered gzip chunk (see shipping.LogChunker) instead of uploading the
+    files themselves.
+    """
+    if config.DONT_UPLOAD_LOGS:
+        print("Not uploading logs as DONT_UPLOAD_LOGS is True")
+    elif getattr(config, "LOG_CHUNKS", False):
+        from shipping import LogChunker
+
+        log.info("Shipping log chunks...")
+        chunker = LogChunker()
+        for filename in LOG_FILES:
+            chunker.cut(filename)
+        shipped = chunker.ship(log_sink())
+        log.info("Shipped %d log chunks", shipped)
+    else:
+        log.info("Uploading logs...")
+        upload_logs(LOG_FILES)
+        log.info("Finished uploading logs")
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a phase of posting, warning if it goes over its PHASE_BUDGETS entry"""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - start
+        budget = PHASE_BUDGETS[name]
+        if elapsed > budget:
+            log.warning("%s took %.2fs, over its %gs budget", name, elapsed, budget)
+        else:
+            log.debug("%s took %.2fs", name, elapsed)
+
+
+class LogShipper:
+    """Ship the logs on a background thread, so a slow FTP server can't hold up posts
+
+    Only one shipment runs at a time. Everything ship_logs() sends picks up
+    where it left off, so a shipment cut short (by the process exiting) is
+    finished by the next one.
+    """
+
+    def __init__(self) -> None:
+        self.thread = None
+
+    def start(self) -> bool:
+        """Start shipping, unless the last shipment is still going"""
+        if self.thread is not None and self.thread.is_alive():
+            log.warning("Still shipping the last logs, skipping this time")
+            return False
+        self.thread = threading.Thread(target=self.run, name="ship-logs", daemon=True)
+        self.thread.start()
+        return True
+
+    def run(self) -> None:
+        try:
+            with phase("ship"):
+                ship_logs()
+        except Exception:
+            log.exception("Failed to ship logs, they'll go with the next ones")
+
+    def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for shipping to finish, returning if it did"""
+        if self.thread is None:
+            return True
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+
+def ship_logs_with_deadline(deadline: float = PHASE_BUDGETS["ship"]) -> None:
+    """Ship the logs in the background, waiting at most `deadline` seconds
+
+    If shipping is still going at the deadline it's left behind, and stops
+    when the process exits.
+    """
+    shipper = LogShipper()
+    shipper.start()
+    if not shipper.wait(deadline):
+        log.warning("Log shipping passed its %gs deadline, leaving it", deadline)
+        print(f"Log shipping took longer than {deadline:g} seconds, leaving it")
+
+
+def next_slot(slot: float, interval: float, now: float, max_catch_up: int) -> float:
+    """Work out when the slot after `slot` should run
+
+    Slots stay on a fixed grid of `interval` seconds so jitter and slow posts
+    don't make the schedule drift. If the process fell behind (e.g. the host
+    was suspended), at most `max_catch_up` missed slots are posted straight
+    away and the rest are skipped.
+    """
+    slot += interval
+    missed = int((now - slot) // interval)
+    if missed > max_catch_up:
+        log.warning("Skipping %d missed slot(s)", missed - max_catch_up)
+        slot += (missed - max_catch_up) * interval
+    return slot
+
+
+def run_daemon(
+    interval: float,
+    jitter: float = 0,
+    max_catch_up: int = 0,
+    dry_run: bool = False,
+    visibility: Visibility = Visibility("unlisted"),
+    combination_cycle: bool = False,
+    weighted: bool = False,
+) -> None:
+    """Keep posting every `interval` seconds from one long-running process
+
+    The lists, the used state and the Mastodon client are set up once and
+    kept in memory, so each post only costs a pick and a single API call.
+    Each post goes out up to `jitter` seconds after its slot. Logs are shipped
+    in the background, so slow uploads never delay the next post.
+    """
+    state = load_used_state()
+    posted = load_posted()
+    weights = alias_tables(state) if weighted else None
+    shipper = LogShipper()
+    mastodon = None
+    if dry_run is False:
+        mastodon = mastodon_client()
+    log.info("Starting daemon, posting every %g seconds", interval)
+    print(f"Posting every {interval:g} seconds, press Ctrl+C to stop")
+
+    slot = time.time()
+    try:
+        while True:
+            delay = slot + random.uniform(0, jitter) - time.time()
+            if delay > 0:
+                log.debug("Sleeping for %.1f seconds", delay)
+                time.sleep(delay)
+            try:
+                with phase("pick"):
+                    tables = weights.get() if weights is not None else None
+                    status = pick_status(
+                        state, combination_cycle, tables, posted, not dry_run
+                    )
+                with phase("post"):
+                    write_status(status, dry_run, visibility, mastodon)
+                if not dry_run:
+                    remember_posted(posted, status)
+                shipper.start()
+            except Exception:
+                # Don't let one failed post take the whole daemon down
+                log.exception("Failed to post, will try again next slot")
+            slot = next_slot(slot, interval, time.time(), max_catch_up)
+    except KeyboardInterrupt:
+        log.info("Stopping daemon")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description='Generate a string in the format "{folx} can have {treats}, as a treat" and post it to fedi'
@@ -284,6 +1280,51 @@ if __name__ == "__main__":
         action="store_true",
         help="Count the number of possible outputs and exit",
     )
+    parser.add_argument(
+        "--nth",
+        action="store",
+        help="Print combination number N and exit",
+        type=int,
+        metavar="N",
+    )
+    parser.add_argument(
+        "--index-of",
+        action="store",
+        help="Print the combination number of STATUS and exit",
+        metavar="STATUS",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store",
+        help="Pick N statuses as JSON lines without posting them, and exit",
+        type=int,
+        metavar="N",
+    )
+    parser.add_argument(
+        "--commit",
+        action="store_true",
+        help="With --batch, mark the picked folx and treats as used",
+    )
+    parser.add_argument(
+        "--enumerate",
+        action="store_true",
+        help="Print every possible status, one per line, and exit",
+    )
+    parser.add_argument(
+        "--shard",
+        action="store",
+        help="With --enumerate, only print part I of N (counting from 0)",
+        type=parse_shard,
+        default=(0, 1),
+        metavar="I/N",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "jsonl"],
+        action="store",
+        help="Output format for --enumerate (default: text)",
+        default="text",
+    )
     parser.add_argument(
         "--most-interacted",
         action="store",
@@ -291,6 +1332,78 @@ if __name__ == "__main__":
         type=int,
         metavar="COUNT",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="With --most-interacted, reuse the status cache and only fetch what's new",
+    )
+    parser.add_argument(
+        "--refresh-window",
+        action="store",
+        help="With --incremental, always refresh the boost and favourite counts of the newest N statuses (default: 200)",
+        type=int,
+        default=200,
+        metavar="N",
+    )
+    parser.add_argument(
+        "--concurrency",
+        action="store",
+        help="With --most-interacted, fetch up to N pages of statuses at once (default: 1)",
+        type=int,
+        default=1,
+        metavar="N",
+    )
+    parser.add_argument(
+        "--top",
+        action="store",
+        help="With --most-interacted, rank the best K statuses instead of just one (default: 1)",
+        type=int,
+        default=1,
+        metavar="K",
+    )
+    parser.add_argument(
+        "--score",
+        action="store",
+        choices=list(SCORES),
+        help="With --most-interacted, how to score statuses: boosts plus favourites, boosts counted double, with replies too, or per hour since posting (default: engagement)",
+        default="engagement",
+    )
+    parser.add_argument(
+        "--database",
+        action="store_true",
+        help="With --most-interacted, also save the statuses to the SQLite status database",
+    )
+    parser.add_argument(
+        "--query",
+        action="store",
+        choices=["statuses", "folx", "treats"],
+        help="Show the statuses, folx or treats with the most boosts and favourites from the status database and exit",
+    )
+    parser.add_argument(
+        "--since",
+        action="store",
+        help="With --query, only count statuses posted in the last DURATION, like 30d",
+        type=parse_duration,
+        metavar="DURATION",
+    )
+    parser.add_argument(
+        "--limit",
+        action="store",
+        help="With --query, how many to show (default: 20)",
+        type=int,
+        default=20,
+        metavar="N",
+    )
+    parser.add_argument(
+        "--item-stats",
+        action="store_true",
+        help=f"Summarize the boosts and favourites of each folx and treat from the status cache to {ITEM_STATS_FILE} and exit",
+    )
+    parser.add_argument(
+        "--verify-cache",
+        action="store_true",
+        help="Check the status cache against its hashes and exit",
+    )
     parser.add_argument(
         "--status-count",
         action="store_true",
@@ -309,6 +1422,62 @@ if __name__ == "__main__":
         action="store",
         default="unlisted",
     )
+    parser.add_argument(
+        "--combination-cycle",
+        action="store_true",
+        help="Don't repeat a folx and treat pair until every combination has been posted (entries appended to arrays.py join the end of the cycle, any other change to it starts a new one)",
+    )
+    parser.add_argument(
+        "--weighted",
+        action="store_true",
+        help="Favour folx and treats by config.WEIGHTS, or by their boosts and favourites from --item-stats",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and post every INTERVAL seconds instead of posting once",
+    )
+    parser.add_argument(
+        "--interval",
+        action="store",
+        help="Seconds between posts in daemon mode or with --schedule-ahead (default: 3600)",
+        type=float,
+        default=3600,
+        metavar="INTERVAL",
+    )
+    parser.add_argument(
+        "--schedule-ahead",
+        action="store",
+        help="Schedule a post every INTERVAL seconds on the instance to cover the next DURATION (e.g. 12h, 7d), and exit",
+        type=parse_duration,
+        metavar="DURATION",
+    )
+    parser.add_argument(
+        "--jitter",
+        action="store",
+        help="Post up to JITTER seconds after each slot in daemon mode (default: 0)",
+        type=float,
+        default=0,
+        metavar="JITTER",
+    )
+    parser.add_argument(
+        "--max-catch-up",
+        action="store",
+        help="How many missed slots to post straight away after falling behind in daemon mode (default: 0)",
+        type=int,
+        default=0,
+        metavar="COUNT",
+    )
+    parser.add_argument(
+        "--ship-logs",
+        action="store_true",
+        help="Ship the logs and exit, e.g. from a separate cron job to --defer-logs",
+    )
+    parser.add_argument(
+        "--defer-logs",
+        action="store_true",
+        help="Don't ship the logs after posting, leave them for --ship-logs",
+    )
     parser.add_argument("--no-log", action="store_true", help="Disable logging")
     parser.add_argument(
         "-v", "--verbose", action="store_true", help="Enable verbose logging"
@@ -323,84 +1492,128 @@ if __name__ == "__main__":
         count_combinations()
         sys.exit(0)
 
+    if args.nth is not None:
+        try:
+            print(render(*nth_combination(args.nth)))
+        except IndexError as e:
+            print(e)
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.ship_logs:
+        with phase("ship"):
+            ship_logs()
+        sys.exit(0)
+
+    if args.weighted and args.combination_cycle:
+        parser.error("--weighted can't be used with --combination-cycle")
+
+    if args.batch is not None:
+        if args.weighted:
+            parser.error("--weighted can't be used with --batch")
+        if args.batch < 1:
+            parser.error("--batch must be at least 1")
+        batch(args.batch, args.combination_cycle, args.commit)
+        sys.exit(0)
+
+    if args.enumerate:
+        enumerate_statuses(args.shard, args.format)
+        sys.exit(0)
+
+    if args.index_of is not None:
+        index = index_of(args.index_of)
+        if index is None:
+            print("That isn't a status I can make")
+            sys.exit(1)
+        print(index)
+        sys.exit(0)
+
     if args.update_bio:
         update_bio(args.dry_run)
         sys.exit(0)
 
+    if args.verify_cache:
+        store = StatusStore()
+        bad_days = store.verify()
+        for day in bad_days:
+            date = datetime.fromtimestamp(day * 24 * 60 * 60, timezone.utc).date()
+            print(f"Statuses from {date} don't match their hash")
+        if bad_days:
+            sys.exit(1)
+        print(f"{len(store)} statuses over {len(store.buckets)} days all match")
+        print(f"Hash: {store.root_hash()}")
+        sys.exit(0)
+
     if args.status_count:
-        mastodon = Mastodon(
-            access_token=config.ACCESS_TOKEN, api_base_url=config.API_URL
-        )
+        mastodon = mastodon_client()
         total_statuses = get_status_count(mastodon)
         print(total_statuses)
         sys.exit(0)
 
     if args.most_interacted:
+        if args.concurrency < 1:
+            parser.error("--concurrency must be at least 1")
+        if args.top < 1:
+            parser.error("--top must be at least 1")
         check_count = int(args.most_interacted)
-        most_interacted(check_count)
+        most_interacted(
+            check_count,
+            incremental=args.incremental,
+            refresh_window=args.refresh_window,
+            concurrency=args.concurrency,
+            top=args.top,
+            score=args.score,
+            database=args.database,
+        )
         sys.exit(0)
 
-    used_folx = get_used("folx")
-    used_treats = get_used("treats")
-
-    # Remove previously used folx
-    available_folx = [item for item in FOLX if item not in used_folx]
-    log.debug("%d unused folx remaining", len(available_folx))
-    if len(available_folx) == 0:
-        available_folx = FOLX
-        clear_used("folx")
-
-    available_treats = [item for item in TREATS if item not in used_treats]
-    log.debug("%d unused treats remaining", len(available_treats))
-    if len(available_treats) == 0:
-        available_treats = TREATS
-        clear_used("treats")
-
-    # Totally pointless shuffle :3
-    random.shuffle(available_treats)
-    random.shuffle(available_folx)
-
-    # Choose a random folx and treat from the remaining available options
-    folx = random.choice(available_folx)
-    treat = random.choice(available_treats)
-
-    # Handle 'alternate wording' treats
-    if treat.startswith("{") and treat.endswith("}"):
-        if json.loads(treat).get("alt_wording") == "True" and "text" in json.loads(
-            treat
-        ):
-            alt_wording = True
-            treat_text = json.loads(treat)["text"]
-            log.debug('Using alternate wording for treat: "%s"', treat_text)
-        else:
-            # Something went wrong with the formatting
-            log.error("Treat formatting error - invalid JSON: %s", treat)
-            sys.exit(1)
-    else:
-        alt_wording = False
-        treat_text = treat
-
-    log.debug('Picked folx "%s" and treat "%s"', folx, treat_text)
-
-    # Save the chosen folx and treat so they can't be picked again
-    save_used("folx", folx)
-    save_used("treats", treat)
+    if args.item_stats:
+        write_item_stats()
+        sys.exit(0)
 
-    treat_or_threat = "threat" if should_be_threat() else "treat"
+    if args.query:
+        if args.limit < 1:
+            parser.error("--limit must be at least 1")
+        query_database(args.query, args.limit, args.since)
+        sys.exit(0)
 
-    if alt_wording:
-        status = f"{folx} {treat_text}, as a {treat_or_threat}"
-    else:
-        status = f"{folx} can have {treat_text}, as a {treat_or_threat}"
+    if args.schedule_ahead is not None:
+        if args.interval <= 0:
+            parser.error("--interval must be greater than 0")
+        schedule_ahead(
+            args.schedule_ahead,
+            args.interval,
+            dry_run=args.dry_run,
+            visibility=args.visibility,
+            combination_cycle=args.combination_cycle,
+            weighted=args.weighted,
+        )
+        sys.exit(0)
 
-    write_status(status, args.dry_run, args.visibility)
+    if args.daemon:
+        if args.interval <= 0:
+            parser.error("--interval must be greater than 0")
+        run_daemon(
+            args.interval,
+            jitter=args.jitter,
+            max_catch_up=args.max_catch_up,
+            dry_run=args.dry_run,
+            visibility=args.visibility,
+            combination_cycle=args.combination_cycle,
+            weighted=args.weighted,
+        )
+        sys.exit(0)
 
-    # Upload logs
-    if config.DONT_UPLOAD_LOGS:
-        print("Not uploading logs as DONT_UPLOAD_LOGS is True")
+    with phase("pick"):
+        posted = load_posted()
+        state = load_used_state()
+        tables = alias_tables(state).get() if args.weighted else None
+        status = pick_status(state, args.combination_cycle, tables, posted)
+    with phase("post"):
+        write_status(status, args.dry_run, args.visibility)
+    if not args.dry_run:
+        remember_posted(posted, status)
+    if args.defer_logs:
+        log.info("Leaving the logs for --ship-logs")
     else:
-        log.info("Uploading logs...")
-        upload_logs("used_folx")
-        upload_logs("used_treats")
-        upload_logs("as-a-treat.log")
-        log.info("Finished uploading logs")
+        ship_logs_with_deadline()
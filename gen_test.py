@@ -0,0 +1,495 @@
+import argparse
+import gen
+import json
+import pytest
+from collections import Counter
+from datetime import datetime, timezone
+from gen import next_slot, parse_duration
+from statuses import StatusStore
+from types import SimpleNamespace
+
+
+def test_next_slot_on_time():
+    assert next_slot(0, 60, 1, max_catch_up=0) == 60
+
+
+def test_next_slot_skips_missed():
+    # Fell behind by a bit over 3 slots
+    assert next_slot(0, 60, 200, max_catch_up=0) == 180
+
+
+def test_next_slot_catches_up():
+    assert next_slot(0, 60, 200, max_catch_up=1) == 120
+    assert next_slot(0, 60, 200, max_catch_up=10) == 60
+
+
+def test_offline_commands_skip_network_imports():
+    from bench_startup import OFFLINE_COMMANDS, network_imports, run_importtime
+
+    for command in OFFLINE_COMMANDS:
+        _, imports = run_importtime(command)
+        assert network_imports(imports) == set()
+
+
+def test_parse_duration():
+    assert parse_duration("3600") == 3600
+    assert parse_duration("90m") == 90 * 60
+    assert parse_duration("1d12h") == 36 * 60 * 60
+
+
+@pytest.mark.parametrize("value", ["", "12x", "h", "1.5h", "-1h"])
+def test_parse_duration_rejects_nonsense(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_duration(value)
+
+
+class Page(list):
+    """A page of statuses that knows where the next one starts"""
+
+    next_max_id = None
+
+
+class FakeMastodon:
+    """Just enough of the Mastodon client to crawl a timeline"""
+
+    def __init__(self, count):
+        # One status an hour, with Mastodon style ids
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+        self.statuses = [
+            SimpleNamespace(
+                id=gen.snowflake_id(start + (count - i) * 3600) + 7,
+                created_at=datetime.fromtimestamp(
+                    start + (count - i) * 3600, timezone.utc
+                ),
+                url=f"https://example.com/{count - i}",
+                content=f"<p>status {count - i}</p>",
+                reblogs_count=(count - i) % 7,
+                favourites_count=(count - i) % 5,
+                replies_count=(count - i) % 3,
+            )
+            for i in range(count)
+        ]
+        self.requests = 0
+        self.ratelimit_remaining = 300
+        self.ratelimit_reset = 0
+        self.me_calls = 0
+
+    def me(self):
+        self.me_calls += 1
+        return SimpleNamespace(
+            id=1, username="treats", statuses_count=len(self.statuses)
+        )
+
+    def account_statuses(
+        self, id, exclude_replies, exclude_reblogs, limit, max_id=None, since_id=None
+    ):
+        self.requests += 1
+        older = [
+            s
+            for s in self.statuses
+            if (max_id is None or s.id < int(max_id))
+            and (since_id is None or s.id > int(since_id))
+        ]
+        page = Page(older[:limit])
+        if len(older) > limit:
+            page.next_max_id = page[-1].id
+        return page
+
+    def account_update_credentials(self, note):
+        self.requests += 1
+        self.note = note
+
+    def scheduled_statuses(self, limit):
+        # Everything fits on one page, so fetch_next() finds no more
+        self.requests += 1
+        return Page(getattr(self, "scheduled", []))
+
+    def status_post(self, status, visibility, scheduled_at, idempotency_key):
+        self.requests += 1
+        if getattr(self, "fail_posts", False):
+            raise RuntimeError("422 Unprocessable Entity")
+        self.scheduled = getattr(self, "scheduled", [])
+        self.scheduled.append(
+            SimpleNamespace(id=len(self.scheduled) + 1, scheduled_at=scheduled_at)
+        )
+        return self.scheduled[-1]
+
+    def fetch_next(self, page):
+        if page.next_max_id is None:
+            return None
+        return self.account_statuses(1, True, True, 40, max_id=page.next_max_id)
+
+
+def test_most_interacted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fake = FakeMastodon(100)
+    monkeypatch.setattr(gen, "mastodon_client", lambda: fake)
+    gen.most_interacted(80)
+
+    store = StatusStore()
+    assert store.header["statuses_count"] == 80
+    result = json.loads((tmp_path / "most_interacted.json").read_text())
+    best = max(fake.statuses[:80], key=lambda s: s.reblogs_count + s.favourites_count)
+    assert result["id"] == best.id
+    assert fake.me_calls == 1
+
+
+def test_most_interacted_database(tmp_path, monkeypatch):
+    from database import StatusDatabase
+
+    monkeypatch.chdir(tmp_path)
+    fake = FakeMastodon(100)
+    monkeypatch.setattr(gen, "mastodon_client", lambda: fake)
+    gen.most_interacted(50)
+    # The database is started off with the statuses already in the store
+    gen.most_interacted(30, incremental=True, refresh_window=10, database=True)
+
+    with StatusDatabase() as db:
+        assert len(db) == len(StatusStore())
+        best = db.top(1)[0]
+        assert best["engagement"] == max(
+            s.reblogs_count + s.favourites_count for s in fake.statuses
+        )
+
+
+def test_most_interacted_top(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fake = FakeMastodon(100)
+    monkeypatch.setattr(gen, "mastodon_client", lambda: fake)
+    gen.most_interacted(80, top=5, score="replies")
+
+    result = json.loads((tmp_path / "most_interacted.json").read_text())
+    ranking = result["ranking"]
+    assert [entry["rank"] for entry in ranking] == [1, 2, 3, 4, 5]
+    scores = sorted(
+        (
+            s.reblogs_count + s.favourites_count + s.replies_count
+            for s in fake.statuses[:80]
+        ),
+        reverse=True,
+    )
+    assert [entry["score"] for entry in ranking] == scores[:5]
+    assert result["id"] == ranking[0]["id"]
+
+
+def test_most_interacted_incremental(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fake = FakeMastodon(100)
+    monkeypatch.setattr(gen, "mastodon_client", lambda: fake)
+    gen.most_interacted(100)
+
+    # Two new statuses, and an old one got more boosts
+    newer = FakeMastodon(102)
+    newer.statuses[5].reblogs_count = 1000
+    monkeypatch.setattr(gen, "mastodon_client", lambda: newer)
+    gen.most_interacted(100, incremental=True, refresh_window=10)
+
+    store = StatusStore()
+    assert store.header["statuses_count"] == 102
+    assert next(store.newest())["id"] == newer.statuses[0].id
+    assert store.get(newer.statuses[5].id)["reblogs_count"] == 1000
+    assert newer.requests == 1
+    result = json.loads((tmp_path / "most_interacted.json").read_text())
+    assert result["id"] == newer.statuses[5].id
+
+
+@pytest.mark.parametrize("count", [30, 100, 1000])
+def test_most_interacted_parallel(tmp_path, monkeypatch, count):
+    monkeypatch.chdir(tmp_path)
+    fake = FakeMastodon(1200)
+    monkeypatch.setattr(gen, "mastodon_client", lambda: fake)
+    gen.most_interacted(count, concurrency=4)
+
+    store = StatusStore()
+    assert [s["id"] for s in store.newest()] == [s.id for s in fake.statuses[:count]]
+
+
+def test_throttle(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(gen.time, "sleep", sleeps.append)
+    monkeypatch.setattr(gen.time, "time", lambda: 1000)
+    fake = SimpleNamespace(ratelimit_remaining=100, ratelimit_reset=1010)
+    throttle = gen.Throttle(reserve=10)
+
+    throttle.wait(fake)
+    assert sleeps == []
+    fake.ratelimit_remaining = 5
+    throttle.wait(fake)
+    assert sleeps == [2]
+    fake.ratelimit_remaining = 0
+    throttle.wait(fake)
+    assert sleeps == [2, 10]
+    # The limit has already reset
+    fake.ratelimit_reset = 900
+    throttle.wait(fake)
+    assert sleeps == [2, 10]
+
+
+def test_every_call_is_throttled(monkeypatch):
+    fake = FakeMastodon(50)
+    waits = []
+    monkeypatch.setattr(gen.throttle, "wait", waits.append)
+    monkeypatch.setattr(gen, "_me_cache", None)
+    monkeypatch.setattr(gen, "mastodon_client", lambda: fake)
+
+    gen.get_me(fake)
+    gen.update_bio()
+    list(gen.crawl_statuses(fake))
+    # Plus one before the fetch_next() that finds there are no more pages
+    assert len(waits) == fake.requests + fake.me_calls + 1
+
+
+def test_get_me_is_cached(monkeypatch):
+    fake = FakeMastodon(1)
+    assert gen.get_me(fake).username == "treats"
+    gen.get_me(fake)
+    assert fake.me_calls == 1
+
+    later = gen.time.time() + gen.ME_TTL + 1
+    monkeypatch.setattr(gen.time, "time", lambda: later)
+    gen.get_me(fake)
+    assert fake.me_calls == 2
+
+
+class PostedFirst:
+    """A posted filter where the first `count` statuses looked up were posted"""
+
+    def __init__(self, count):
+        self.count = count
+        self.lookups = []
+
+    def __contains__(self, status):
+        self.lookups.append(status)
+        return len(self.lookups) <= self.count
+
+
+def test_pick_status_redraws_without_using_up_rejects(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    posted = PostedFirst(5)
+    status = gen.pick_status(gen.load_used_state(), posted=posted)
+
+    assert len(posted.lookups) == 6 and status == posted.lookups[-1]
+    state = gen.load_used_state()
+    assert len(state["folx"]) == len(state["treats"]) == 1
+    folx = gen.FOLX_ITEMS[state["folx"].order[0]].entry
+    treat = gen.TREAT_ITEMS[state["treats"].order[0]].entry
+    assert gen.get_used("folx") == [folx]
+    assert gen.get_used("treats") == [treat]
+
+
+def test_pick_status_gives_up_redrawing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    posted = PostedFirst(gen.MAX_REDRAWS + 10)
+    state = gen.load_used_state()
+    gen.pick_status(state, posted=posted)
+
+    assert len(posted.lookups) == gen.MAX_REDRAWS + 1
+    assert len(state["folx"]) == len(state["treats"]) == 1
+
+
+def test_combination_cycle_redraws(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    posted = PostedFirst(3)
+    state = gen.load_used_state()
+    status = gen.pick_status(state, combination_cycle=True, posted=posted)
+
+    assert len(posted.lookups) == 4 and status == posted.lookups[-1]
+    assert state.combinations.counter == 4
+    assert len(gen.get_used("folx")) == len(gen.get_used("treats")) == 1
+
+
+def test_schedule_ahead_dry_run_uses_nothing_up(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    gen.schedule_ahead(6 * 3600, 3600, dry_run=True)
+
+    assert capsys.readouterr().out.count("Dry run: would have scheduled") == 6
+    assert not (tmp_path / gen.STATE_FILE).exists()
+    assert gen.get_used("folx") == gen.get_used("treats") == []
+
+
+def test_schedule_ahead_keeps_to_daily_limit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fake = FakeMastodon(0)
+    monkeypatch.setattr(gen, "mastodon_client", lambda: fake)
+    gen.schedule_ahead(3 * 24 * 3600, 1800)
+
+    per_day = Counter(status.scheduled_at.date() for status in fake.scheduled)
+    assert max(per_day.values()) == gen.MAX_SCHEDULED_PER_DAY
+    assert len(gen.get_used("folx")) == len(fake.scheduled)
+
+    # Running again only fills up what's left of each day
+    gen.schedule_ahead(4 * 24 * 3600, 1800)
+    per_day = Counter(status.scheduled_at.date() for status in fake.scheduled)
+    assert max(per_day.values()) == gen.MAX_SCHEDULED_PER_DAY
+
+
+def test_schedule_ahead_failed_post_uses_nothing_up(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fake = FakeMastodon(0)
+    fake.fail_posts = True
+    monkeypatch.setattr(gen, "mastodon_client", lambda: fake)
+    with pytest.raises(RuntimeError):
+        gen.schedule_ahead(3600, 1800)
+
+    assert not (tmp_path / gen.STATE_FILE).exists()
+    assert gen.get_used("folx") == []
+
+
+def test_daemon_dry_run_uses_nothing_up(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sleeps = []
+
+    def sleep(delay):
+        sleeps.append(delay)
+        if len(sleeps) == 3:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(gen.time, "sleep", sleep)
+    monkeypatch.setattr(gen, "LogShipper", lambda: SimpleNamespace(start=lambda: None))
+    gen.run_daemon(0.01, dry_run=True)
+
+    assert not (tmp_path / gen.STATE_FILE).exists()
+    assert gen.get_used("folx") == gen.get_used("treats") == []
+
+
+class FakeFTP:
+    """An FTP server that keeps its files in memory"""
+
+    files: dict = {}
+    sessions: list = []
+    # How many bytes get through before the connection times out, if it does
+    cut_off: int | None = None
+
+    def __init__(self, host, user, password, timeout=None):
+        self.commands = []
+        FakeFTP.sessions.append(self)
+
+    def cwd(self, path):
+        pass
+
+    def voidcmd(self, command):
+        pass
+
+    def size(self, filename):
+        import ftplib
+
+        if filename not in self.files:
+            raise ftplib.error_perm("550 No such file")
+        return len(self.files[filename])
+
+    def storbinary(self, command, fp):
+        self.commands.append(command)
+        verb, filename = command.split(" ", 1)
+        data = fp.read()
+        if self.cut_off is not None:
+            data = data[: self.cut_off]
+        if verb == "APPE":
+            self.files[filename] += data
+        else:
+            self.files[filename] = data
+        if self.cut_off is not None:
+            raise TimeoutError("timed out")
+
+    def quit(self):
+        pass
+
+
+def test_upload_logs_sends_only_new_bytes(tmp_path, monkeypatch):
+    import ftplib
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(FakeFTP, "files", {})
+    monkeypatch.setattr(FakeFTP, "sessions", [])
+    monkeypatch.setattr(ftplib, "FTP", FakeFTP)
+    log = tmp_path / "as-a-treat.log"
+    used = tmp_path / "used_folx"
+    log.write_text("one\n")
+    used.write_text("Foxes\n")
+
+    gen.upload_logs(["as-a-treat.log", "used_folx"])
+    assert len(FakeFTP.sessions) == 1
+    assert FakeFTP.sessions[0].commands == ["STOR as-a-treat.log", "STOR used_folx"]
+
+    with open(log, "a") as f:
+        f.write("two\n")
+    gen.upload_logs(["as-a-treat.log", "used_folx"])
+    assert FakeFTP.sessions[1].commands == ["APPE as-a-treat.log"]
+    assert FakeFTP.files["as-a-treat.log"] == b"one\ntwo\n"
+
+    # Rewritten rather than appended to
+    used.write_text("Bees\nCryptids\n")
+    gen.upload_logs(["as-a-treat.log", "used_folx"])
+    assert FakeFTP.sessions[2].commands == ["STOR used_folx"]
+    assert FakeFTP.files["used_folx"] == b"Bees\nCryptids\n"
+
+    # The server lost its copy
+    del FakeFTP.files["as-a-treat.log"]
+    with open(log, "a") as f:
+        f.write("three\n")
+    gen.upload_logs(["as-a-treat.log"])
+    assert FakeFTP.files["as-a-treat.log"] == b"one\ntwo\nthree\n"
+
+
+def test_upload_logs_resumes_cut_off_upload(tmp_path, monkeypatch):
+    import ftplib
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(FakeFTP, "files", {})
+    monkeypatch.setattr(FakeFTP, "sessions", [])
+    monkeypatch.setattr(ftplib, "FTP", FakeFTP)
+    log = tmp_path / "as-a-treat.log"
+    log.write_text("one\ntwo\n")
+
+    monkeypatch.setattr(FakeFTP, "cut_off", 3)
+    with pytest.raises(TimeoutError):
+        gen.upload_logs(["as-a-treat.log"])
+    assert FakeFTP.files["as-a-treat.log"] == b"one"
+
+    with open(log, "a") as f:
+        f.write("three\n")
+    with pytest.raises(TimeoutError):
+        gen.upload_logs(["as-a-treat.log"])
+    assert FakeFTP.sessions[1].commands == ["APPE as-a-treat.log"]
+    assert FakeFTP.files["as-a-treat.log"] == b"one\ntw"
+
+    monkeypatch.setattr(FakeFTP, "cut_off", None)
+    gen.upload_logs(["as-a-treat.log"])
+    assert FakeFTP.sessions[2].commands == ["APPE as-a-treat.log"]
+    assert FakeFTP.files["as-a-treat.log"] == b"one\ntwo\nthree\n"
+    gen.upload_logs(["as-a-treat.log"])
+    assert FakeFTP.sessions[3].commands == []
+
+
+def test_ship_logs_with_deadline(monkeypatch):
+    import threading
+
+    release = threading.Event()
+    shipped = threading.Event()
+
+    def slow_ship_logs():
+        release.wait(5)
+        shipped.set()
+
+    monkeypatch.setattr(gen, "ship_logs", slow_ship_logs)
+    start = gen.time.monotonic()
+    gen.ship_logs_with_deadline(0.1)
+    # Gave up at the deadline instead of waiting for the upload
+    assert gen.time.monotonic() - start < 2
+    assert not shipped.is_set()
+    release.set()
+
+
+def test_log_shipper_skips_while_busy(monkeypatch):
+    import threading
+
+    release = threading.Event()
+    calls = []
+    monkeypatch.setattr(gen, "ship_logs", lambda: calls.append(release.wait(5)))
+    shipper = gen.LogShipper()
+    assert shipper.start()
+    assert not shipper.start()
+    release.set()
+    assert shipper.wait(5)
+    assert shipper.start()
+    assert shipper.wait(5)
+    assert calls == [True, True]
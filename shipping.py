@@ -0,0 +1,176 @@
+import gzip
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, BinaryIO, Protocol
+
+if TYPE_CHECKING:
+    import ftplib
+
+log = logging.getLogger(__name__)
+
+CHUNK_DIR = "log_chunks"
+# How many bytes before the chunked size are kept to check a log was only
+# appended to since
+CHECK_BYTES = 256
+
+
+class Sink(Protocol):
+    """Somewhere to ship log chunks to
+
+    Chunks are immutable, so `put` is only ever called once per name, unless
+    an earlier attempt failed part way through.
+    """
+
+    def put(self, name: str, data: bytes) -> None:
+        """Store a chunk under its name"""
+
+    def close(self) -> None:
+        """Finish shipping, closing any connection"""
+
+
+class LocalSink:
+    """Ship chunks to a directory on this machine"""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, name: str, data: bytes) -> None:
+        path = os.path.join(self.directory, name)
+        with open(path + ".part", "wb") as f:
+            f.write(data)
+        os.replace(path + ".part", path)
+
+    def close(self) -> None:
+        pass
+
+
+class FTPSink:
+    """Ship chunks to a directory on an FTP server, over one session
+
+    The session is only opened once there is something to send. Each chunk is
+    uploaded under a temporary name and renamed, so a chunk with its real
+    name is always complete.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        user: str,
+        password: str,
+        directory: str,
+        port: int = 21,
+        timeout: float | None = None,
+    ) -> None:
+        self.address = (host, port)
+        self.timeout = timeout
+        self.credentials = (user, password)
+        self.directory = directory
+        self.session: "ftplib.FTP | None" = None
+
+    def put(self, name: str, data: bytes) -> None:
+        import ftplib
+        import io
+
+        if self.session is None:
+            self.session = ftplib.FTP(timeout=self.timeout)
+            self.session.connect(*self.address)
+            self.session.login(*self.credentials)
+            self.session.cwd(self.directory)
+        self.session.storbinary(f"STOR {name}.part", io.BytesIO(data))
+        self.session.rename(f"{name}.part", name)
+
+    def close(self) -> None:
+        if self.session is not None:
+            self.session.quit()
+            self.session = None
+
+
+def read_check(f: BinaryIO, size: int) -> bytes:
+    """Read the bytes just before `size`, to recognise the file later"""
+    f.seek(max(size - CHECK_BYTES, 0))
+    return f.read(min(size, CHECK_BYTES))
+
+
+def chunk_name(filename: str, generation: int, number: int) -> str:
+    """Name a chunk so that sorting a log's chunks by name puts them in order"""
+    return f"{filename}.{generation:04}.{number:06}.gz"
+
+
+class LogChunker:
+    """Cut logs into numbered gzip chunks of what was appended since last time
+
+    Joining the chunks of a log's latest generation, in order, gives the
+    whole log. When a log is cleared or rewritten instead of appended to, a
+    new generation starts with the whole file as its first chunk. Chunks are
+    kept in `directory` until they've been shipped, so a failed upload is
+    just tried again next time.
+    """
+
+    def __init__(self, directory: str = CHUNK_DIR) -> None:
+        self.directory = directory
+        self.path = os.path.join(directory, "chunks.json")
+        self.logs: dict[str, dict] = {}
+        self.pending: list[str] = []
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.logs = data["logs"]
+            self.pending = data["pending"]
+
+    def save(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"logs": self.logs, "pending": self.pending}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def cut(self, filename: str) -> str | None:
+        """Chunk whatever has been added to a log, returning the chunk's name"""
+        if not os.path.isfile(filename):
+            log.error("File %s does not exist", filename)
+            return None
+        saved = self.logs.get(filename, {"generation": 0, "next": 0, "size": 0})
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            offset = saved["size"]
+            if offset > size or read_check(f, offset).hex() != saved.get("check"):
+                if saved["next"] > 0:
+                    log.info("%s was rewritten, starting a new generation", filename)
+                    saved = {"generation": saved["generation"] + 1, "next": 0}
+                offset = 0
+            if offset == size and saved["next"] > 0:
+                return None
+            f.seek(offset)
+            data = f.read(size - offset)
+            check = read_check(f, size)
+
+        name = chunk_name(filename, saved["generation"], saved["next"])
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "wb") as f:
+            f.write(gzip.compress(data, mtime=0))
+        self.logs[filename] = saved | {
+            "next": saved["next"] + 1,
+            "size": size,
+            "check": check.hex(),
+        }
+        self.pending.append(name)
+        self.save()
+        return name
+
+    def ship(self, sink: Sink) -> int:
+        """Send the chunks that haven't been shipped yet, returning how many were"""
+        shipped = 0
+        try:
+            while self.pending:
+                name = self.pending[0]
+                path = os.path.join(self.directory, name)
+                with open(path, "rb") as f:
+                    sink.put(name, f.read())
+                self.pending.pop(0)
+                self.save()
+                os.remove(path)
+                shipped += 1
+        finally:
+            sink.close()
+        return shipped
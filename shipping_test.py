@@ -0,0 +1,87 @@
+import gzip
+import pytest
+import threading
+from shipping import FTPSink, LocalSink, LogChunker
+
+
+def rebuild(directory, filename):
+    """Join the chunks of a log's latest generation back together"""
+    chunks = sorted(directory.glob(f"{filename}.*.gz"))
+    latest = chunks[-1].name.split(".")[-3]
+    return b"".join(
+        gzip.decompress(chunk.read_bytes())
+        for chunk in chunks
+        if chunk.name.split(".")[-3] == latest
+    )
+
+
+def ship(tmp_path, sink):
+    chunker = LogChunker(str(tmp_path / "chunks"))
+    for filename in ("as-a-treat.log", "used_folx"):
+        chunker.cut(filename)
+    return chunker.ship(sink)
+
+
+def test_chunks_rebuild_the_logs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    shipped = tmp_path / "shipped"
+    sink = LocalSink(str(shipped))
+    log = tmp_path / "as-a-treat.log"
+    used = tmp_path / "used_folx"
+    log.write_text("one\n")
+    used.write_text("Foxes\n")
+    assert ship(tmp_path, sink) == 2
+
+    with open(log, "a") as f:
+        f.write("two\n")
+    assert ship(tmp_path, sink) == 1
+    assert ship(tmp_path, sink) == 0
+    assert rebuild(shipped, "as-a-treat.log") == b"one\ntwo\n"
+
+    # Cleared and rewritten, so a new generation starts
+    used.write_text("Bees\n")
+    assert ship(tmp_path, sink) == 1
+    assert (shipped / "used_folx.0001.000000.gz").exists()
+    assert rebuild(shipped, "used_folx") == b"Bees\n"
+    assert not list((tmp_path / "chunks").glob("*.gz"))
+
+
+def test_failed_chunks_are_shipped_later(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "as-a-treat.log").write_text("one\n")
+    (tmp_path / "used_folx").write_text("Foxes\n")
+
+    class BrokenSink(LocalSink):
+        def put(self, name, data):
+            raise OSError("Connection reset")
+
+    with pytest.raises(OSError):
+        ship(tmp_path, BrokenSink(str(tmp_path / "shipped")))
+    assert ship(tmp_path, LocalSink(str(tmp_path / "shipped"))) == 2
+    assert rebuild(tmp_path / "shipped", "used_folx") == b"Foxes\n"
+
+
+def test_ftp_sink(tmp_path, monkeypatch):
+    authorizers = pytest.importorskip("pyftpdlib.authorizers")
+    handlers = pytest.importorskip("pyftpdlib.handlers")
+    servers = pytest.importorskip("pyftpdlib.servers")
+
+    remote = tmp_path / "remote"
+    (remote / "as-a-treat").mkdir(parents=True)
+    authorizer = authorizers.DummyAuthorizer()
+    authorizer.add_user("treats", "hunter2", str(remote), perm="elrwfm")
+    handler = type("Handler", (handlers.FTPHandler,), {"authorizer": authorizer})
+    server = servers.FTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"timeout": 0.1})
+    thread.start()
+    try:
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "as-a-treat.log").write_text("one\n")
+        (tmp_path / "used_folx").write_text("Foxes\n")
+        port = server.socket.getsockname()[1]
+        sink = FTPSink("127.0.0.1", "treats", "hunter2", "as-a-treat", port)
+        assert ship(tmp_path, sink) == 2
+    finally:
+        server.close_all()
+        thread.join()
+    assert rebuild(remote / "as-a-treat", "as-a-treat.log") == b"one\n"
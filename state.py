@@ -0,0 +1,420 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+from array import array
+from combinations import FeistelPermutation
+from treats import Item
+
+log = logging.getLogger(__name__)
+
+STATE_FILE = "used_state.json"
+STATE_VERSION = 3
+# Item ids are this many bytes of hash, see treats.item_id()
+ID_BYTES = 6
+
+
+def ids_digest(items: tuple[Item, ...]) -> str:
+    """Hash the ids of a list of items, in order"""
+    hasher = hashlib.blake2b(digest_size=16)
+    for item in items:
+        hasher.update(item.id.encode())
+    return hasher.hexdigest()
+
+
+def pack(values: array) -> str:
+    """Encode an array of unsigned ints as little-endian base64"""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode()
+
+
+def unpack(data: str) -> array:
+    """Decode the output of pack()"""
+    values = array("I", base64.b64decode(data))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def pack_ids(ids: list[str]) -> str:
+    """Encode a list of item ids as base64"""
+    return base64.b64encode(bytes.fromhex("".join(ids))).decode()
+
+
+def unpack_ids(data: str) -> list[str]:
+    """Decode the output of pack_ids()"""
+    raw = base64.b64decode(data)
+    ids = []
+    for start in range(0, len(raw), ID_BYTES):
+        end = start + ID_BYTES
+        ids.append(raw[start:end].hex())
+    return ids
+
+
+class ShuffleBag:
+    """A shuffled order of the positions in a list, and how far through it we are
+
+    Everything before the cursor has been used this cycle, so drawing is just
+    reading the next position, and nothing repeats until the bag is empty.
+    `where` maps each position back to its place in the order, so checking or
+    marking a single item is O(1) too.
+    """
+
+    __slots__ = ("seed", "order", "where", "cursor")
+
+    def __init__(self, size: int, seed: int | None = None) -> None:
+        self.order = array("I", range(size))
+        self.reshuffle(seed)
+
+    def reindex(self) -> None:
+        """Rebuild `where` from `order`"""
+        # Sized by the largest position, as a restored bag can be missing
+        # positions until the new entries are merged in
+        size = max(self.order, default=-1) + 1
+        self.where = array("I", bytes(4 * size))
+        for place, index in enumerate(self.order):
+            self.where[index] = place
+
+    @property
+    def size(self) -> int:
+        return len(self.order)
+
+    def __contains__(self, index: int) -> bool:
+        return self.where[index] < self.cursor
+
+    def __len__(self) -> int:
+        return self.cursor
+
+    def is_full(self) -> bool:
+        return self.cursor >= self.size
+
+    def swap(self, a: int, b: int) -> None:
+        """Swap two places in the order"""
+        order = self.order
+        order[a], order[b] = order[b], order[a]
+        self.where[order[a]] = a
+        self.where[order[b]] = b
+
+    def add(self, index: int) -> None:
+        """Mark a position as used by moving it just before the cursor"""
+        if index not in self:
+            self.swap(self.where[index], self.cursor)
+            self.cursor += 1
+
+    def put_back(self, index: int) -> None:
+        """Return a used position to a random place in the part still to come"""
+        if index in self:
+            self.cursor -= 1
+            self.swap(self.where[index], self.cursor)
+            self.swap(self.cursor, random.randint(self.cursor, self.size - 1))
+
+    def next(self) -> int:
+        """Draw the next position"""
+        if self.is_full():
+            raise ValueError("Every item has been used")
+        index = self.order[self.cursor]
+        self.cursor += 1
+        return index
+
+    def take(self, count: int) -> array:
+        """Draw the next `count` positions at once, reshuffling at the end of a cycle
+
+        Within a cycle this is a single slice of the order.
+        """
+        taken = array("I")
+        while len(taken) < count:
+            if self.is_full():
+                self.reshuffle()
+            start = self.cursor
+            end = min(self.size, start + count - len(taken))
+            taken.extend(self.order[start:end])
+            self.cursor = end
+        return taken
+
+    def reshuffle(self, seed: int | None = None) -> None:
+        """Start a new cycle with a new order"""
+        self.seed = random.getrandbits(64) if seed is None else seed
+        order = list(range(self.size))
+        random.Random(self.seed).shuffle(order)
+        self.order = array("I", order)
+        self.cursor = 0
+        self.reindex()
+
+    @classmethod
+    def restore(cls, order: list[int], cursor: int, seed: int) -> "ShuffleBag":
+        """Rebuild a bag from a saved order, where the first `cursor` are used"""
+        bag = cls(0, seed)
+        bag.order = array("I", order)
+        bag.cursor = cursor
+        bag.reindex()
+        return bag
+
+    def merge(self, indices: list[int]) -> None:
+        """Add new positions at random places in the part of the bag still to come
+
+        The order has to hold every other position already, so that together
+        they make up the whole list again.
+        """
+        for index in indices:
+            self.order.append(index)
+            end = len(self.order) - 1
+            place = random.randint(self.cursor, end)
+            self.order[place], self.order[end] = self.order[end], self.order[place]
+        self.reindex()
+
+    def grow(self, size: int) -> None:
+        """Add positions up to `size` at random places in the part still to come"""
+        self.merge(list(range(self.size, size)))
+
+
+class CombinationCycle:
+    """A walk through every folx and treat pair in a keyed pseudo-random order
+
+    Only a key and a counter are stored, yet no pair comes up twice until
+    all folx * treats of them have been used. Pair n is folx n // treats and
+    treat n % treats.
+
+    When entries are appended to the lists part way through, the cycle
+    carries on: the pairs it was already walking come first, and the pairs
+    with a new folx or a new treat follow in an order with a key of their
+    own. Each of these parts is a segment, saved as the list lengths at its
+    end and its key.
+    """
+
+    __slots__ = ("counter", "segments", "permutations")
+
+    def __init__(
+        self, folx: int, treats: int, key: bytes | None = None, counter: int = 0
+    ) -> None:
+        self.restart(folx, treats, key, counter)
+
+    @property
+    def folx(self) -> int:
+        return self.segments[-1][0]
+
+    @property
+    def treats(self) -> int:
+        return self.segments[-1][1]
+
+    @property
+    def size(self) -> int:
+        return self.folx * self.treats
+
+    def restart(
+        self, folx: int, treats: int, key: bytes | None = None, counter: int = 0
+    ) -> None:
+        """Start a cycle with the given key, or a new random one"""
+        self.segments: list[tuple[int, int, bytes]] = []
+        self.permutations: list[FeistelPermutation] = []
+        self.counter = counter
+        self.extend(folx, treats, key)
+
+    def extend(self, folx: int, treats: int, key: bytes | None = None) -> None:
+        """Add the pairs that longer lists make to the end of the cycle"""
+        old = self.size if self.segments else 0
+        key = os.urandom(16) if key is None else key
+        self.segments.append((folx, treats, key))
+        self.permutations.append(FeistelPermutation(folx * treats - old, key))
+
+    @classmethod
+    def restore(
+        cls, segments: list[tuple[int, int, bytes]], counter: int
+    ) -> "CombinationCycle":
+        cycle = cls(*segments[0], counter=counter)
+        for segment in segments[1:]:
+            cycle.extend(*segment)
+        return cycle
+
+    def is_full(self) -> bool:
+        return self.counter >= self.size
+
+    def next(self) -> int:
+        """Get the next pair number, starting a new cycle with a new key if needed"""
+        if self.is_full():
+            log.info("Used every combination, starting a new cycle")
+            self.restart(self.folx, self.treats)
+        offset = self.counter
+        old_folx = old_treats = 0
+        for (folx, treats, _), permutation in zip(self.segments, self.permutations):
+            if offset < permutation.size:
+                break
+            offset -= permutation.size
+            old_folx, old_treats = folx, treats
+        n = permutation(offset)
+        self.counter += 1
+        # A segment is the new folx with every treat, then the old folx with
+        # the new treats
+        new_folx_pairs = (folx - old_folx) * treats
+        if n < new_folx_pairs:
+            return (old_folx + n // treats) * self.treats + n % treats
+        folx_index, treat_index = divmod(n - new_folx_pairs, treats - old_treats)
+        return folx_index * self.treats + old_treats + treat_index
+
+
+class UsedState:
+    """The shuffle bags for each list, saved to a small JSON file
+
+    Each bag is saved as its order of stable item ids (see treats.item_id())
+    rather than positions, so editing arrays.py doesn't lose the cycle: removed
+    entries drop out of the bag and moved ones keep their place. Version 1
+    and 2 files were saved by position, and are only kept if the list hasn't
+    changed apart from new entries at the end.
+    """
+
+    def __init__(self, lists: dict[str, tuple[Item, ...]]) -> None:
+        self.lists = lists
+        self.digests = {name: ids_digest(items) for name, items in lists.items()}
+        self.bags = {name: ShuffleBag(len(items)) for name, items in lists.items()}
+        self.combinations_digest = hashlib.blake2b(
+            "".join(self.digests.values()).encode(), digest_size=16
+        ).hexdigest()
+        self.cycle: CombinationCycle | None = None
+
+    def __getitem__(self, name: str) -> ShuffleBag:
+        return self.bags[name]
+
+    @classmethod
+    def load(cls, filename: str, lists: dict[str, tuple[Item, ...]]) -> "UsedState":
+        """Load the state from a file, or start with nothing used"""
+        state = cls(lists)
+        if not os.path.isfile(filename):
+            return state
+        with open(filename, "r") as f:
+            data = json.load(f)
+        version = data.get("version")
+        if version not in (1, 2, STATE_VERSION):
+            log.warning("Ignoring %s with unknown version", filename)
+            return state
+
+        for name, items in lists.items():
+            saved = data.get(name)
+            if saved is None:
+                continue
+            if version == STATE_VERSION:
+                state.bags[name] = state.restore_bag(name, saved)
+                continue
+            count = saved["count"]
+            if count == len(items):
+                digest = state.digests[name]
+            else:
+                digest = ids_digest(items[:count])
+            if count > len(items) or digest != saved["digest"]:
+                log.warning("%s changed in arrays.py, starting a new cycle", name)
+                continue
+
+            if version == 1:
+                # Version 1 only had a bitmap of used positions
+                bag = ShuffleBag(count)
+                bits = int.from_bytes(base64.b64decode(saved["bits"]), "little")
+                for index in range(count):
+                    if bits >> index & 1:
+                        bag.add(index)
+            else:
+                bag = ShuffleBag.restore(
+                    unpack(saved["order"]), saved["cursor"], saved["seed"]
+                )
+            if count < len(items):
+                log.info("Adding %d new %s to the bag", len(items) - count, name)
+                bag.grow(len(items))
+            state.bags[name] = bag
+
+        saved = data.get("combinations")
+        if saved is not None:
+            state.restore_cycle(saved)
+        return state
+
+    def restore_bag(self, name: str, saved: dict) -> ShuffleBag:
+        """Rebuild a bag from the saved order of item ids
+
+        Ids that are no longer in arrays.py drop out, and the rest keep their
+        place, wherever they've moved to in the list.
+        """
+        items = self.lists[name]
+        positions = {item.id: index for index, item in enumerate(items)}
+        ids = unpack_ids(saved["order"])
+        cursor = saved["cursor"]
+        used_ids, rest_ids = ids[:cursor], ids[cursor:]
+        used = [positions[i] for i in used_ids if i in positions]
+        rest = [positions[i] for i in rest_ids if i in positions]
+        removed = len(ids) - len(used) - len(rest)
+        if removed:
+            log.info("%d %s were removed from arrays.py", removed, name)
+        bag = ShuffleBag.restore(used + rest, len(used), saved["seed"])
+
+        known = set(ids)
+        new = [index for index, item in enumerate(items) if item.id not in known]
+        if new:
+            log.info("Adding %d new %s to the bag", len(new), name)
+            bag.merge(new)
+        return bag
+
+    def restore_cycle(self, saved: dict) -> None:
+        """Carry on the saved combination cycle, if arrays.py was only added to
+
+        Entries appended to either list are walked after the rest of the
+        cycle (see CombinationCycle.extend()). Any other change starts a new
+        cycle, as the saved pair numbers no longer mean the same pairs.
+        """
+        folx, treats = len(self.lists["folx"]), len(self.lists["treats"])
+        if "segments" not in saved:
+            # Older files only had the one key, for lists exactly like these
+            if saved["digest"] == self.combinations_digest:
+                self.cycle = CombinationCycle(
+                    folx, treats, bytes.fromhex(saved["key"]), saved["counter"]
+                )
+            else:
+                log.warning("arrays.py changed, starting a new combination cycle")
+            return
+
+        segments = [
+            (segment["folx"], segment["treats"], bytes.fromhex(segment["key"]))
+            for segment in saved["segments"]
+        ]
+        counts = {"folx": segments[-1][0], "treats": segments[-1][1]}
+        for name, count in counts.items():
+            items = self.lists[name]
+            if count > len(items) or ids_digest(items[:count]) != saved[name]:
+                log.warning("arrays.py changed, starting a new combination cycle")
+                return
+        self.cycle = CombinationCycle.restore(segments, saved["counter"])
+        if (folx, treats) != (counts["folx"], counts["treats"]):
+            log.info("Adding the new combinations to the end of the cycle")
+            self.cycle.extend(folx, treats)
+
+    @property
+    def combinations(self) -> CombinationCycle:
+        """The cycle through every combination of the lists, created when first used"""
+        if self.cycle is None:
+            self.cycle = CombinationCycle(
+                len(self.lists["folx"]), len(self.lists["treats"])
+            )
+        return self.cycle
+
+    def save(self, filename: str) -> None:
+        """Save the state, replacing the old file in one go"""
+        data: dict = {"version": STATE_VERSION}
+        for name, bag in self.bags.items():
+            items = self.lists[name]
+            data[name] = {
+                "seed": bag.seed,
+                "cursor": bag.cursor,
+                "order": pack_ids([items[index].id for index in bag.order]),
+            }
+        if self.cycle is not None:
+            data["combinations"] = {
+                "folx": self.digests["folx"],
+                "treats": self.digests["treats"],
+                "segments": [
+                    {"folx": folx, "treats": treats, "key": key.hex()}
+                    for folx, treats, key in self.cycle.segments
+                ],
+                "counter": self.cycle.counter,
+            }
+        with open(filename + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(filename + ".tmp", filename)
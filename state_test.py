@@ -0,0 +1,216 @@
+import base64
+import json
+from array import array
+from state import ShuffleBag, UsedState, pack
+from treats import compile_items
+
+FOLX = compile_items(["Foxes", "Bees", "Cryptids"])
+TREATS = compile_items(["a headpat", "a new GPU"])
+
+
+def test_bag_mark_used():
+    bag = ShuffleBag(10)
+    bag.add(3)
+    bag.add(3)
+    assert 3 in bag
+    assert 4 not in bag
+    assert len(bag) == 1
+    assert 3 not in [bag.next() for _ in range(9)]
+
+
+def test_bag_put_back():
+    bag = ShuffleBag(10)
+    drawn = [bag.next() for _ in range(3)]
+    bag.put_back(drawn[0])
+    bag.put_back(drawn[0])
+    assert drawn[0] not in bag
+    assert drawn[1] in bag and drawn[2] in bag
+    assert len(bag) == 2
+    rest = [bag.next() for _ in range(8)]
+    assert sorted(drawn[1:] + rest) == list(range(10))
+
+
+def test_bag_cycle_has_no_repeats():
+    bag = ShuffleBag(20)
+    drawn = [bag.next() for _ in range(20)]
+    assert sorted(drawn) == list(range(20))
+    assert bag.is_full()
+
+
+def test_bag_grow_keeps_cycle():
+    bag = ShuffleBag(10)
+    drawn = [bag.next() for _ in range(5)]
+    bag.grow(15)
+    drawn += [bag.next() for _ in range(10)]
+    assert sorted(drawn) == list(range(15))
+
+
+def test_state_round_trip(tmp_path):
+    filename = str(tmp_path / "state.json")
+    state = UsedState({"folx": FOLX, "treats": TREATS})
+    first = state["folx"].next()
+    state.save(filename)
+
+    loaded = UsedState.load(filename, {"folx": FOLX, "treats": TREATS})
+    assert first in loaded["folx"]
+    assert list(loaded["folx"].order) == list(state["folx"].order)
+    assert len(loaded["treats"]) == 0
+
+
+def test_state_keeps_cycle_when_entries_are_appended(tmp_path):
+    filename = str(tmp_path / "state.json")
+    state = UsedState({"folx": FOLX})
+    state["folx"].add(2)
+    state.save(filename)
+
+    more_folx = FOLX + compile_items(["Wyverns"])
+    loaded = UsedState.load(filename, {"folx": more_folx})
+    assert 2 in loaded["folx"]
+    assert loaded["folx"].size == 4
+
+
+def test_state_merges_entries_inserted_anywhere(tmp_path):
+    filename = str(tmp_path / "state.json")
+    state = UsedState({"folx": FOLX})
+    drawn = [state["folx"].next() for _ in range(2)]
+    state.save(filename)
+
+    more_folx = compile_items(["Wyverns"]) + FOLX[:2] + compile_items(["Moths"])
+    more_folx += FOLX[2:]
+    loaded = UsedState.load(filename, {"folx": more_folx})
+    bag = loaded["folx"]
+    assert bag.size == 5
+    assert sorted(more_folx[i].text for i in bag.order[:2]) == sorted(
+        FOLX[i].text for i in drawn
+    )
+    rest = {bag.next() for _ in range(3)}
+    assert {0, 3} <= rest
+    assert bag.is_full()
+
+
+def test_state_keeps_cycle_when_entries_are_reordered(tmp_path):
+    filename = str(tmp_path / "state.json")
+    state = UsedState({"folx": FOLX})
+    state["folx"].add(2)
+    state.save(filename)
+
+    loaded = UsedState.load(filename, {"folx": FOLX[::-1]})
+    assert list(loaded["folx"].order[:1]) == [0]
+    assert len(loaded["folx"]) == 1
+
+
+def test_state_keeps_cycle_when_entries_are_removed(tmp_path):
+    filename = str(tmp_path / "state.json")
+    state = UsedState({"folx": FOLX})
+    for index in (0, 2):
+        state["folx"].add(index)
+    state.save(filename)
+
+    # Bees, which wasn't used, and Foxes, which was, are gone
+    loaded = UsedState.load(filename, {"folx": FOLX[2:]})
+    assert len(loaded["folx"]) == 1
+    assert 0 in loaded["folx"]
+    assert loaded["folx"].is_full()
+
+
+def test_state_upgrades_positions(tmp_path):
+    filename = tmp_path / "state.json"
+    state = UsedState({"folx": FOLX})
+    saved = {
+        "count": 3,
+        "digest": state.digests["folx"],
+        "seed": 1,
+        "cursor": 1,
+        "order": pack(array("I", [2, 0, 1])),
+    }
+    filename.write_text(json.dumps({"version": 2, "folx": saved}))
+
+    loaded = UsedState.load(str(filename), {"folx": FOLX})
+    assert list(loaded["folx"].order) == [2, 0, 1]
+    assert 2 in loaded["folx"] and len(loaded["folx"]) == 1
+
+
+def test_state_upgrades_bitmap(tmp_path):
+    filename = tmp_path / "state.json"
+    state = UsedState({"folx": FOLX})
+    saved = {
+        "count": 3,
+        "digest": state.digests["folx"],
+        "bits": base64.b64encode(bytes([0b101])).decode(),
+    }
+    filename.write_text(json.dumps({"version": 1, "folx": saved}))
+
+    loaded = UsedState.load(str(filename), {"folx": FOLX})
+    assert 0 in loaded["folx"] and 2 in loaded["folx"]
+    assert loaded["folx"].next() == 1
+
+
+def test_combination_cycle_round_trip(tmp_path):
+    filename = str(tmp_path / "state.json")
+    lists = {"folx": FOLX, "treats": TREATS}
+    state = UsedState(lists)
+    drawn = [state.combinations.next() for _ in range(4)]
+    state.save(filename)
+
+    loaded = UsedState.load(filename, lists)
+    drawn += [loaded.combinations.next() for _ in range(2)]
+    assert sorted(drawn) == list(range(6))
+    assert loaded.combinations.is_full()
+
+
+def test_combination_cycle_keeps_going_when_entries_are_appended(tmp_path):
+    filename = str(tmp_path / "state.json")
+    state = UsedState({"folx": FOLX, "treats": TREATS})
+    drawn = [state.combinations.next() for _ in range(4)]
+    state.save(filename)
+
+    folx = FOLX + compile_items(["Otters"])
+    treats = TREATS + compile_items(["a nap"])
+    lists = {"folx": folx, "treats": treats}
+    loaded = UsedState.load(filename, lists)
+    # The old pairs are renumbered for the longer treats list
+    drawn = [pair // 2 * 3 + pair % 2 for pair in drawn]
+    rest = [loaded.combinations.next() for _ in range(8)]
+    assert sorted(drawn + rest) == list(range(12))
+    assert all(pair // 3 < 3 and pair % 3 < 2 for pair in rest[:2])
+    assert loaded.combinations.is_full()
+
+    loaded.save(filename)
+    loaded = UsedState.load(filename, lists)
+    assert loaded.combinations.is_full()
+
+
+def test_combination_cycle_restarts_when_entries_change(tmp_path):
+    filename = str(tmp_path / "state.json")
+    state = UsedState({"folx": FOLX, "treats": TREATS})
+    state.combinations.next()
+    state.save(filename)
+
+    folx = compile_items(["Otters"]) + FOLX
+    loaded = UsedState.load(filename, {"folx": folx, "treats": TREATS})
+    assert loaded.cycle is None
+
+
+def test_combination_cycle_upgrades_single_key(tmp_path):
+    filename = tmp_path / "state.json"
+    state = UsedState({"folx": FOLX, "treats": TREATS})
+    drawn = [state.combinations.next() for _ in range(3)]
+    saved = {
+        "digest": state.combinations_digest,
+        "key": state.combinations.segments[0][2].hex(),
+        "counter": 3,
+    }
+    filename.write_text(json.dumps({"version": 3, "combinations": saved}))
+
+    loaded = UsedState.load(str(filename), {"folx": FOLX, "treats": TREATS})
+    drawn += [loaded.combinations.next() for _ in range(3)]
+    assert sorted(drawn) == list(range(6))
+
+
+def test_bag_take_wraps_into_new_cycle():
+    bag = ShuffleBag(5)
+    taken = bag.take(3)
+    assert len(set(taken)) == 3
+    taken += bag.take(4)
+    assert sorted(taken[:5]) == list(range(5))
+    assert len(bag) == 2
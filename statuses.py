@@ -0,0 +1,524 @@
+import bisect
+import hashlib
+import heapq
+import html
+import json
+import logging
+import math
+import os
+import re
+import sys
+from array import array
+from collections.abc import Callable, Iterable, Iterator
+from combinations import parse_status
+from datetime import datetime, timezone
+from treats import FOLX_ITEMS, TREAT_ITEMS
+from typing import Any, BinaryIO
+
+log = logging.getLogger(__name__)
+
+# The old single-file cache, only read to move it into the store
+CACHE_FILE = "statuses_cache.json"
+STORE_FILE = "statuses_cache.ndjson"
+ITEM_STATS_FILE = "item_stats.json"
+# How many superseded lines the store can hold, on top of one per status,
+# before it gets compacted
+COMPACT_SLACK = 1000
+# How many favourites a boost is worth in the "weighted" score
+BOOST_WEIGHT = 2
+TAG_PATTERN = re.compile(r"<[^>]*>")
+DAY_MS = 24 * 60 * 60 * 1000
+HASH_MODULUS = 2**256
+
+
+def status_record(status: Any) -> dict:
+    """Get the parts of a status from the API that are kept in the cache"""
+    record = {
+        "id": status.id,
+        "timestamp": status.created_at.isoformat(),
+        "url": status.url,
+        "content": status.content,
+        "reblogs_count": status.reblogs_count,
+        "favourites_count": status.favourites_count,
+        "replies_count": status.replies_count,
+    }
+    return annotate(record)
+
+
+def annotate(record: dict) -> dict:
+    """Add the ids of the folx and treat a cached status used, if it's one of ours
+
+    Statuses that don't parse, or whose entries have since been removed from
+    arrays.py, get None for all three.
+    """
+    parsed = parse_status(status_text(record))
+    if parsed is None:
+        return record | {"folx_id": None, "treat_id": None, "threat": None}
+    folx, treat, threat = parsed
+    return record | {
+        "folx_id": FOLX_ITEMS[folx].id,
+        "treat_id": TREAT_ITEMS[treat].id,
+        "threat": threat,
+    }
+
+
+def status_text(record: dict) -> str:
+    """Get the plain text of a cached status from its HTML content"""
+    text = TAG_PATTERN.sub("", record["content"].replace("<br>", "\n"))
+    return html.unescape(text).strip()
+
+
+def engagement(record: dict) -> float:
+    """Score a cached status by its boosts and favourites"""
+    return record["reblogs_count"] + record["favourites_count"]
+
+
+def weighted_engagement(record: dict) -> float:
+    """Score a cached status by its boosts and favourites, with boosts worth more"""
+    return BOOST_WEIGHT * record["reblogs_count"] + record["favourites_count"]
+
+
+def engagement_with_replies(record: dict) -> float:
+    """Score a cached status by its boosts, favourites and replies"""
+    # Statuses cached before replies were kept don't have a count
+    return engagement(record) + record.get("replies_count", 0)
+
+
+def engagement_per_hour(record: dict) -> float:
+    """Score a cached status by its boosts and favourites per hour since posting"""
+    posted = datetime.fromisoformat(record["timestamp"])
+    hours = (datetime.now(timezone.utc) - posted).total_seconds() / 3600
+    return engagement(record) / max(hours, 1)
+
+
+SCORES: dict[str, Callable[[dict], float]] = {
+    "engagement": engagement,
+    "weighted": weighted_engagement,
+    "replies": engagement_with_replies,
+    "per-hour": engagement_per_hour,
+}
+
+
+def top_statuses(
+    records: Iterable[dict], count: int, score: Callable[[dict], float] = engagement
+) -> list[tuple[float, dict]]:
+    """Get the `count` highest scoring statuses with their scores, best first
+
+    Only `count` statuses are kept at a time, in a heap, so this takes
+    O(n log count) time and O(count) memory however many statuses there are.
+    Ties go to the newer status.
+    """
+    heap: list[tuple[float, int, dict]] = []
+    for record in records:
+        entry = (score(record), int(record["id"]), record)
+        if len(heap) < count:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    return [
+        (value, record)
+        for value, _, record in sorted(heap, key=lambda e: e[:2], reverse=True)
+    ]
+
+
+def percentile(ordered: array, fraction: float) -> int:
+    """Get the nearest-rank percentile of some sorted numbers"""
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def summarize(values: array) -> dict:
+    """Get the mean, median and 95th percentile of some counts"""
+    ordered = array(values.typecode, sorted(values))
+    return {
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "median": percentile(ordered, 0.5),
+        "p95": percentile(ordered, 0.95),
+    }
+
+
+class ItemTally:
+    """The boosts and favourites of every status that used one folx or treat"""
+
+    __slots__ = ("boosts", "favourites", "last_posted")
+
+    def __init__(self) -> None:
+        self.boosts = array("I")
+        self.favourites = array("I")
+        self.last_posted = ""
+
+    def add(self, record: dict) -> None:
+        self.boosts.append(record["reblogs_count"])
+        self.favourites.append(record["favourites_count"])
+        self.last_posted = max(self.last_posted, record["timestamp"])
+
+    def summary(self) -> dict:
+        if not self.boosts:
+            return {"count": 0, "last_posted": None}
+        return {
+            "count": len(self.boosts),
+            "boosts": summarize(self.boosts),
+            "favourites": summarize(self.favourites),
+            "last_posted": self.last_posted,
+        }
+
+
+def item_stats(records: Iterable[dict]) -> dict[str, dict[str, dict]]:
+    """Summarize the engagement of each folx and treat in one pass over statuses
+
+    Only the counts for each item are kept while going through, in arrays of
+    unsigned ints, so the statuses themselves can be streamed from the store.
+    Every item currently in arrays.py is included, even ones never posted.
+    """
+    tallies: dict[str, dict[str, ItemTally]] = {
+        "folx": {item.id: ItemTally() for item in FOLX_ITEMS},
+        "treats": {item.id: ItemTally() for item in TREAT_ITEMS},
+    }
+    for record in records:
+        if "folx_id" not in record:
+            record = annotate(record)
+        for kind, key in (("folx", "folx_id"), ("treats", "treat_id")):
+            tally = tallies[kind].get(record[key])
+            if tally is not None:
+                tally.add(record)
+    texts = {item.id: item.text for item in FOLX_ITEMS + TREAT_ITEMS}
+    return {
+        kind: {
+            item_id: {"text": texts[item_id], **tally.summary()}
+            for item_id, tally in items.items()
+        }
+        for kind, items in tallies.items()
+    }
+
+
+def merge_records(old: list[dict], new: list[dict]) -> list[dict]:
+    """Merge two lists of cached statuses, newest first
+
+    Where a status is in both, the one from `new` wins, so its boost and
+    favourite counts are the fresher ones.
+    """
+    by_id = {int(record["id"]): record for record in old}
+    for record in new:
+        by_id[int(record["id"])] = record
+    return [by_id[key] for key in sorted(by_id, reverse=True)]
+
+
+def leaf_digest(record: dict) -> int:
+    """Hash one cached status"""
+    data = json.dumps(record, sort_keys=True).encode()
+    return int.from_bytes(hashlib.sha256(data).digest(), "big")
+
+
+def bucket_of(status_id: int) -> int:
+    """Get the day a status was posted on, from its Mastodon id"""
+    return (status_id >> 16) // DAY_MS
+
+
+def root_hash(buckets: dict[int, int]) -> str:
+    """Hash a set of day buckets into one hash for the whole store"""
+    hasher = hashlib.sha256()
+    for day in sorted(buckets):
+        hasher.update(f"{day}:{buckets[day]:064x}\n".encode())
+    return hasher.hexdigest()
+
+
+def diff_buckets(first: dict[int, int], second: dict[int, int]) -> list[int]:
+    """Get the days on which two stores have different statuses"""
+    days = first.keys() | second.keys()
+    return sorted(day for day in days if first.get(day) != second.get(day))
+
+
+def load_cache() -> dict | None:
+    """Load the old single-file status cache, if there is one"""
+    if not os.path.isfile(CACHE_FILE):
+        return None
+    with open(CACHE_FILE, "r") as f:
+        return json.load(f)
+
+
+def to_little_endian(values: array) -> bytes:
+    """Get the bytes of an array in little-endian order"""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(data: bytes) -> array:
+    """Read an array of unsigned 64-bit ints written by to_little_endian()"""
+    values = array("Q", data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class StatusStore:
+    """The bot's statuses, kept as an append-only file of JSON lines
+
+    Each line is a whole status. When a status changes (e.g. it gets more
+    boosts) the new version is appended and the old line is left behind, so
+    an update never rewrites the file. compact() clears out the old lines
+    once they make up most of it.
+
+    A small binary index of ids and byte offsets, sorted by id, points at the
+    latest line for each status, so single statuses can be read without going
+    through the whole file. A JSON header holds the details that used to sit
+    at the top of statuses_cache.json. If the bot stopped after appending but
+    before saving the index, the lines past the end of the index are picked
+    up the next time the store is opened.
+
+    The store is hashed as a two level tree. Each day's statuses are hashed
+    into a bucket by adding up their SHA-256 hashes (mod 2**256), so adding
+    or changing a status only touches its own bucket. The buckets are then
+    hashed together into root_hash(). Two stores can be compared a day at a
+    time with diff_buckets(), and verify() re-checks any days against what's
+    actually in the file.
+    """
+
+    def __init__(self, path: str = STORE_FILE) -> None:
+        self.path = path
+        self.index_path = path + ".index"
+        self.header_path = path + ".header.json"
+        self.ids = array("Q")
+        self.offsets = array("Q")
+        self.header: dict = {}
+        self.lines = 0
+        self.buckets: dict[int, int] = {}
+
+        if os.path.isfile(self.header_path):
+            with open(self.header_path, "r") as f:
+                self.header = json.load(f)
+        if not os.path.isfile(self.path):
+            return
+
+        indexed = self.header.get("bytes", 0)
+        count = self.header.get("count", 0)
+        index_ok = (
+            os.path.isfile(self.index_path)
+            and os.path.getsize(self.index_path) == count * 16
+            and indexed <= os.path.getsize(self.path)
+        )
+        if index_ok:
+            with open(self.index_path, "rb") as f:
+                self.ids = from_little_endian(f.read(count * 8))
+                self.offsets = from_little_endian(f.read(count * 8))
+            self.lines = self.header.get("lines", count)
+            self.buckets = {
+                int(day): int(digest, 16)
+                for day, digest in self.header.get("hash_buckets", {}).items()
+            }
+        else:
+            log.warning("%s is out of date, rebuilding it", self.index_path)
+            indexed = 0
+        if indexed < os.path.getsize(self.path):
+            self.scan(indexed)
+        if self.ids and not self.buckets:
+            self.buckets = self.rehash()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def scan(self, start: int) -> None:
+        """Index and hash the lines from byte `start` onwards"""
+        found = {}
+        leaves = {}
+        with open(self.path, "rb+") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Half-written when the bot stopped, drop it
+                    log.warning("Dropping a partly written line from %s", self.path)
+                    f.truncate(offset)
+                    break
+                record = json.loads(line)
+                status_id = int(record["id"])
+                leaf = leaf_digest(record)
+                if status_id in leaves:
+                    old_leaf = leaves[status_id]
+                else:
+                    old_leaf = self.indexed_leaf(status_id)
+                self.fold(status_id, old_leaf, leaf)
+                leaves[status_id] = leaf
+                found[status_id] = offset
+                offset += len(line)
+                self.lines += 1
+        self.add_to_index(found)
+
+    def indexed_leaf(self, status_id: int) -> int | None:
+        """Hash the indexed version of a status, if there is one"""
+        record = self.get(status_id)
+        return None if record is None else leaf_digest(record)
+
+    def fold(self, status_id: int, old_leaf: int | None, new_leaf: int) -> None:
+        """Swap the hash of a status's old version for its new one in its bucket"""
+        day = bucket_of(status_id)
+        digest = self.buckets.get(day, 0) + new_leaf
+        if old_leaf is not None:
+            digest -= old_leaf
+        self.buckets[day] = digest % HASH_MODULUS
+
+    def rehash(self, first_id: int = 0, last_id: int = 2**64 - 1) -> dict[int, int]:
+        """Work out the buckets from the file, for statuses with ids in a range"""
+        buckets: dict[int, int] = {}
+        if not self.ids:
+            return buckets
+        start = bisect.bisect_left(self.ids, first_id)
+        stop = bisect.bisect_right(self.ids, last_id)
+        with open(self.path, "rb") as f:
+            for position in range(start, stop):
+                day = bucket_of(self.ids[position])
+                leaf = leaf_digest(self.read_at(f, self.offsets[position]))
+                buckets[day] = (buckets.get(day, 0) + leaf) % HASH_MODULUS
+        return buckets
+
+    def verify(self, days: list[int] | None = None) -> list[int]:
+        """Check the stored bucket hashes against the file, returning bad days
+
+        Only the given days are read, or every day if none are given.
+        """
+        if days is None:
+            actual = self.rehash()
+            days = sorted(actual.keys() | self.buckets.keys())
+        else:
+            actual = {}
+            for day in days:
+                first_id = (day * DAY_MS) << 16
+                last_id = ((day + 1) * DAY_MS << 16) - 1
+                actual.update(self.rehash(first_id, last_id))
+        return [day for day in days if actual.get(day) != self.buckets.get(day)]
+
+    def root_hash(self) -> str:
+        return root_hash(self.buckets)
+
+    def add_to_index(self, found: dict[int, int]) -> None:
+        """Point the index at new lines, given as {id: offset}"""
+        new = []
+        for status_id, offset in found.items():
+            position = bisect.bisect_left(self.ids, status_id)
+            if position < len(self.ids) and self.ids[position] == status_id:
+                self.offsets[position] = offset
+            else:
+                new.append((status_id, offset))
+        if not new:
+            return
+        new.sort()
+        if not self.ids or new[0][0] > self.ids[-1]:
+            # The usual case, only newer statuses
+            self.ids.extend(status_id for status_id, _ in new)
+            self.offsets.extend(offset for _, offset in new)
+        else:
+            pairs = sorted([*zip(self.ids, self.offsets), *new])
+            self.ids = array("Q", (status_id for status_id, _ in pairs))
+            self.offsets = array("Q", (offset for _, offset in pairs))
+
+    def read_at(self, f: BinaryIO, offset: int) -> dict:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+    def get(self, status_id: int | str) -> dict | None:
+        """Get the latest version of a status, or None if it isn't stored"""
+        status_id = int(status_id)
+        position = bisect.bisect_left(self.ids, status_id)
+        if position == len(self.ids) or self.ids[position] != status_id:
+            return None
+        with open(self.path, "rb") as f:
+            return self.read_at(f, self.offsets[position])
+
+    def newest(self, count: int | None = None) -> Iterator[dict]:
+        """Yield the latest version of each status, newest first"""
+        if not self.ids:
+            return
+        stop = -1 if count is None else max(len(self.ids) - count, 0) - 1
+        with open(self.path, "rb") as f:
+            for position in range(len(self.ids) - 1, stop, -1):
+                yield self.read_at(f, self.offsets[position])
+
+    def newest_id(self) -> int:
+        return self.ids[-1] if self.ids else 0
+
+    def oldest_id(self) -> int:
+        return self.ids[0] if self.ids else 0
+
+    def update(self, records: list[dict]) -> int:
+        """Append the statuses that are new or have changed, returning how many"""
+        lines = {
+            int(record["id"]): (json.dumps(record) + "\n").encode()
+            for record in records
+        }
+        old_leaves: dict[int, int | None] = {}
+        if self.ids:
+            with open(self.path, "rb") as f:
+                for status_id, line in list(lines.items()):
+                    position = bisect.bisect_left(self.ids, status_id)
+                    if position < len(self.ids) and self.ids[position] == status_id:
+                        f.seek(self.offsets[position])
+                        old_line = f.readline()
+                        if old_line == line:
+                            del lines[status_id]
+                        else:
+                            old_leaves[status_id] = leaf_digest(json.loads(old_line))
+
+        found = {}
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            for status_id, line in lines.items():
+                f.write(line)
+                found[status_id] = offset
+                offset += len(line)
+                self.fold(
+                    status_id, old_leaves.get(status_id), leaf_digest(json.loads(line))
+                )
+        self.lines += len(found)
+        self.add_to_index(found)
+        return len(found)
+
+    def compact(self) -> None:
+        """Rewrite the file with only the latest version of each status"""
+        found = {}
+        with open(self.path, "rb") as old, open(self.path + ".tmp", "wb") as new:
+            for position in range(len(self.ids) - 1, -1, -1):
+                old.seek(self.offsets[position])
+                found[self.ids[position]] = new.tell()
+                new.write(old.readline())
+        os.replace(self.path + ".tmp", self.path)
+        self.ids, self.offsets = array("Q"), array("Q")
+        self.add_to_index(found)
+        self.lines = len(found)
+
+    def save(self, header: dict | None = None) -> None:
+        """Save the index and header, compacting first if it's mostly old lines"""
+        if self.lines > 2 * len(self) + COMPACT_SLACK:
+            log.info("Compacting %s", self.path)
+            self.compact()
+        if header is not None:
+            self.header = header
+        self.header["count"] = len(self)
+        self.header["lines"] = self.lines
+        self.header["statuses_hash"] = self.root_hash()
+        self.header["hash_buckets"] = {
+            str(day): f"{digest:064x}" for day, digest in sorted(self.buckets.items())
+        }
+        self.header["bytes"] = (
+            os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+        )
+
+        with open(self.index_path + ".tmp", "wb") as f:
+            f.write(to_little_endian(self.ids))
+            f.write(to_little_endian(self.offsets))
+        os.replace(self.index_path + ".tmp", self.index_path)
+        with open(self.header_path + ".tmp", "w") as f:
+            f.write(json.dumps(self.header, indent=4))
+        os.replace(self.header_path + ".tmp", self.header_path)
+
+
+def open_store() -> StatusStore:
+    """Open the status store, moving the old statuses_cache.json into it if needed"""
+    store = StatusStore()
+    if len(store) == 0:
+        cache_content = load_cache()
+        if cache_content is not None:
+            statuses = cache_content.pop("statuses")
+            store.update(statuses)
+            store.save(cache_content)
+            log.info("Moved %d statuses from %s", len(statuses), CACHE_FILE)
+    return store
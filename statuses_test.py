@@ -0,0 +1,180 @@
+import html
+import json
+import statuses
+from statuses import StatusStore, bucket_of, diff_buckets, open_store
+from treats import FOLX_ITEMS, TREAT_ITEMS, render
+
+
+def day(number):
+    """Get a status id from the given day, Mastodon style"""
+    return (number * 24 * 60 * 60 * 1000) << 16
+
+
+def record(status_id, boosts=0):
+    return {
+        "id": status_id,
+        "timestamp": "2025-01-01T00:00:00+00:00",
+        "url": f"https://example.com/{status_id}",
+        "content": f"<p>status {status_id}</p>",
+        "reblogs_count": boosts,
+        "favourites_count": 0,
+    }
+
+
+def test_hash_is_incremental(tmp_path):
+    store = StatusStore(str(tmp_path / "first.ndjson"))
+    store.update([record(day(1)), record(day(2))])
+    store.update([record(day(3)), record(day(1), boosts=4)])
+
+    # The same statuses added in one go, with no history
+    other = StatusStore(str(tmp_path / "second.ndjson"))
+    other.update([record(day(3)), record(day(2)), record(day(1), boosts=4)])
+    assert store.root_hash() == other.root_hash()
+    assert store.buckets == store.rehash()
+
+
+def test_diff_buckets(tmp_path):
+    store = StatusStore(str(tmp_path / "first.ndjson"))
+    store.update([record(day(1)), record(day(2)), record(day(3))])
+    other = StatusStore(str(tmp_path / "second.ndjson"))
+    other.update([record(day(1)), record(day(2), boosts=1)])
+    assert diff_buckets(store.buckets, other.buckets) == [
+        bucket_of(day(2)),
+        bucket_of(day(3)),
+    ]
+
+
+def test_verify(tmp_path):
+    path = tmp_path / "store.ndjson"
+    store = StatusStore(str(path))
+    store.update([record(day(1)), record(day(2))])
+    store.save()
+    assert store.verify() == []
+
+    # Edit a status behind the store's back
+    path.write_text(
+        path.read_text().replace('"reblogs_count": 0', '"reblogs_count": 9', 1)
+    )
+    store = StatusStore(str(path))
+    assert store.verify([bucket_of(day(2))]) == []
+    assert store.verify() == [bucket_of(day(1))]
+
+
+def test_store_appends_only_changes(tmp_path):
+    path = str(tmp_path / "store.ndjson")
+    store = StatusStore(path)
+    assert store.update([record(1), record(2)]) == 2
+    assert store.update([record(1), record(2, boosts=3)]) == 1
+    store.save()
+
+    store = StatusStore(path)
+    assert len(store) == 2
+    assert store.lines == 3
+    assert [r["id"] for r in store.newest()] == [2, 1]
+    assert store.get(2)["reblogs_count"] == 3
+    assert store.get(3) is None
+
+
+def test_store_inserts_older_statuses(tmp_path):
+    store = StatusStore(str(tmp_path / "store.ndjson"))
+    store.update([record(5), record(6)])
+    store.update([record(1), record(3)])
+    assert [r["id"] for r in store.newest(3)] == [6, 5, 3]
+    assert store.oldest_id() == 1
+
+
+def test_store_compacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(statuses, "COMPACT_SLACK", 0)
+    path = str(tmp_path / "store.ndjson")
+    store = StatusStore(path)
+    for boosts in range(5):
+        store.update([record(1, boosts), record(2)])
+    store.save()
+
+    store = StatusStore(path)
+    assert store.lines == 2
+    assert store.get(1)["reblogs_count"] == 4
+    assert len((tmp_path / "store.ndjson").read_text().splitlines()) == 2
+
+
+def test_store_recovers_unindexed_lines(tmp_path):
+    path = str(tmp_path / "store.ndjson")
+    store = StatusStore(path)
+    store.update([record(1)])
+    store.save()
+    # Appended, but stopped before the index was saved, part way into a line
+    store.update([record(2)])
+    with open(path, "a") as f:
+        f.write('{"id": 3, "times')
+
+    store = StatusStore(path)
+    assert [r["id"] for r in store.newest()] == [2, 1]
+    store.update([record(3)])
+    assert store.get(3) == record(3)
+
+
+def test_open_store_moves_old_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    old = {"statuses_count": 2, "statuses": [record(2), record(1)]}
+    (tmp_path / "statuses_cache.json").write_text(json.dumps(old))
+
+    store = open_store()
+    assert len(store) == 2
+    assert store.header["statuses_count"] == 2
+
+
+def test_top_statuses():
+    records = [record(day(n), boosts=n % 4) for n in range(1, 20)]
+    ranking = statuses.top_statuses(records, 3)
+    assert [value for value, _ in ranking] == [3, 3, 3]
+    # Ties go to the newest
+    assert [r["id"] for _, r in ranking] == [day(19), day(15), day(11)]
+    assert len(statuses.top_statuses(records, 100)) == len(records)
+
+
+def test_scores():
+    status = record(day(1), boosts=3) | {"favourites_count": 2, "replies_count": 4}
+    assert statuses.SCORES["engagement"](status) == 5
+    assert statuses.SCORES["weighted"](status) == 3 * statuses.BOOST_WEIGHT + 2
+    assert statuses.SCORES["replies"](status) == 9
+    # Records cached before replies were kept
+    assert statuses.SCORES["replies"](record(day(1), boosts=3)) == 3
+    assert 0 < statuses.SCORES["per-hour"](status) < 5
+
+
+def test_annotate():
+    folx, treat = FOLX_ITEMS[3], TREAT_ITEMS[5]
+    text = html.escape(render(folx, treat, threat=True))
+    annotated = statuses.annotate(record(1) | {"content": f"<p>{text}</p>"})
+    assert annotated["folx_id"] == folx.id
+    assert annotated["treat_id"] == treat.id
+    assert annotated["threat"] is True
+
+    annotated = statuses.annotate(record(1))
+    assert annotated["folx_id"] is annotated["treat_id"] is None
+
+
+def test_item_stats():
+    def posted(status_id, folx, treat, boosts):
+        content = f"<p>{render(FOLX_ITEMS[folx], TREAT_ITEMS[treat])}</p>"
+        return record(status_id, boosts) | {
+            "content": content,
+            "timestamp": f"2025-01-{status_id:02}T00:00:00+00:00",
+        }
+
+    records = [posted(n, 0, n % 2, n) for n in range(1, 21)] + [posted(21, 1, 0, 7)]
+    stats = statuses.item_stats(records)
+
+    first = stats["folx"][FOLX_ITEMS[0].id]
+    assert first["text"] == FOLX_ITEMS[0].text
+    assert first["count"] == 20
+    assert first["boosts"] == {"mean": 10.5, "median": 10, "p95": 19}
+    assert first["favourites"]["p95"] == 0
+    assert first["last_posted"] == "2025-01-20T00:00:00+00:00"
+    assert stats["folx"][FOLX_ITEMS[1].id]["boosts"]["median"] == 7
+    assert stats["treats"][TREAT_ITEMS[0].id]["count"] == 11
+    assert stats["folx"][FOLX_ITEMS[2].id] == {
+        "text": FOLX_ITEMS[2].text,
+        "count": 0,
+        "last_posted": None,
+    }
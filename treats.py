@@ -0,0 +1,65 @@
+import hashlib
+import json
+from arrays import FOLX, TREATS
+from dataclasses import dataclass
+
+
+class TreatFormatError(ValueError):
+    """An entry in arrays.py couldn't be understood"""
+
+
+@dataclass(frozen=True, slots=True)
+class Item:
+    """A folx or treat entry from arrays.py, parsed once at import
+
+    `entry` is the line exactly as it appears in arrays.py, and `id` is a short
+    hash of it, so the id doesn't change when other entries are added, removed
+    or moved around.
+    """
+
+    id: str
+    text: str
+    alt_wording: bool
+    entry: str
+
+
+def item_id(entry: str) -> str:
+    """Get the stable id for an arrays.py entry"""
+    return hashlib.blake2b(entry.encode(), digest_size=6).hexdigest()
+
+
+def compile_item(entry: str) -> Item:
+    """Parse an arrays.py entry, handling 'alternate wording' treats"""
+    if not (entry.startswith("{") and entry.endswith("}")):
+        return Item(item_id(entry), entry, False, entry)
+
+    try:
+        data = json.loads(entry)
+    except json.JSONDecodeError as e:
+        raise TreatFormatError(f"Invalid JSON: {entry}") from e
+    if data.get("alt_wording") != "True" or not data.get("text"):
+        raise TreatFormatError(f'Expected "alt_wording" and "text" keys: {entry}')
+    return Item(item_id(entry), data["text"], True, entry)
+
+
+def compile_items(entries: list[str]) -> tuple[Item, ...]:
+    """Parse a list from arrays.py, rejecting bad or duplicate entries"""
+    items = tuple(compile_item(entry) for entry in entries)
+    ids = set()
+    for item in items:
+        if item.id in ids:
+            raise TreatFormatError(f"Duplicate entry: {item.entry}")
+        ids.add(item.id)
+    return items
+
+
+def render(folx: Item, treat: Item, threat: bool = False) -> str:
+    """Build the status text for a folx and treat"""
+    treat_or_threat = "threat" if threat else "treat"
+    if treat.alt_wording:
+        return f"{folx.text} {treat.text}, as a {treat_or_threat}"
+    return f"{folx.text} can have {treat.text}, as a {treat_or_threat}"
+
+
+FOLX_ITEMS = compile_items(FOLX)
+TREAT_ITEMS = compile_items(TREATS)
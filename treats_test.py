@@ -0,0 +1,42 @@
+import pytest
+from treats import TreatFormatError, compile_item, compile_items, item_id, render
+
+
+def test_compile_plain():
+    item = compile_item("a headpat")
+    assert item.text == "a headpat"
+    assert not item.alt_wording
+    assert item.id == item_id("a headpat")
+
+
+def test_compile_alt_wording():
+    item = compile_item('{"alt_wording": "True", "text": "can do Arson"}')
+    assert item.text == "can do Arson"
+    assert item.alt_wording
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [
+        '{"alt_wording": "True" "text": "can do Arson"}',
+        '{"alt_wording": "True", "text": "can do Arson",}',
+        '{"alt_wording": "False", "text": "can do Arson"}',
+        '{"alt_wording": "True"}',
+    ],
+)
+def test_compile_rejects_bad_json(entry):
+    with pytest.raises(TreatFormatError):
+        compile_item(entry)
+
+
+def test_compile_rejects_duplicates():
+    with pytest.raises(TreatFormatError):
+        compile_items(["a headpat", "a headpat"])
+
+
+def test_render():
+    folx = compile_item("Foxes")
+    treat = compile_item("a headpat")
+    alt = compile_item('{"alt_wording": "True", "text": "can do Arson"}')
+    assert render(folx, treat) == "Foxes can have a headpat, as a treat"
+    assert render(folx, alt, threat=True) == "Foxes can do Arson, as a threat"
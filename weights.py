@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import os
+import random
+from array import array
+from state import ShuffleBag, ids_digest, pack, unpack
+from statuses import ITEM_STATS_FILE
+from treats import Item
+
+log = logging.getLogger(__name__)
+
+ALIAS_FILE = "alias_tables.json"
+# How many weighted draws can land on used items before falling back to the
+# next item in the bag
+MAX_REJECTIONS = 64
+
+
+class AliasTable:
+    """Vose's alias method, for weighted draws from a list in O(1)
+
+    Each position has a threshold and an alias. A draw picks a position
+    uniformly, then keeps it if 32 random bits come in under its threshold and
+    takes its alias otherwise. Building the table is O(n).
+    """
+
+    __slots__ = ("thresholds", "aliases")
+
+    SCALE = 2**32
+
+    def __init__(self, thresholds: array, aliases: array) -> None:
+        self.thresholds = thresholds
+        self.aliases = aliases
+
+    @classmethod
+    def build(cls, weights: list[float]) -> "AliasTable":
+        size = len(weights)
+        total = sum(weights)
+        if size == 0 or total <= 0:
+            raise ValueError("Need at least one positive weight")
+        scaled = [weight * size / total for weight in weights]
+        thresholds = array("I", bytes(4 * size))
+        aliases = array("I", range(size))
+        small = [index for index, value in enumerate(scaled) if value < 1]
+        large = [index for index, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            thresholds[less] = int(scaled[less] * cls.SCALE)
+            aliases[less] = more
+            scaled[more] += scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+        # Whatever is left is 1 give or take rounding, so it aliases itself
+        for index in small + large:
+            thresholds[index] = cls.SCALE - 1
+        return cls(thresholds, aliases)
+
+    def __len__(self) -> int:
+        return len(self.thresholds)
+
+    def draw(self) -> int:
+        index = random.randrange(len(self.thresholds))
+        if random.getrandbits(32) < self.thresholds[index]:
+            return index
+        return self.aliases[index]
+
+
+def load_item_stats() -> dict | None:
+    """Load the output of --item-stats, if it's been run"""
+    if not os.path.isfile(ITEM_STATS_FILE):
+        return None
+    with open(ITEM_STATS_FILE, "r") as f:
+        return json.load(f)
+
+
+def item_weights(
+    items: tuple[Item, ...], manual: dict[str, float], stats: dict[str, dict] | None
+) -> list[float]:
+    """Get the weight of each item in a list
+
+    A weight set by hand, by item text or id, wins. Otherwise an item that has
+    been posted is weighted by its mean boosts plus favourites (plus one, so
+    nothing is never picked). Items that haven't been posted get the average
+    of those, and without any stats everything is weighted 1.
+    """
+    engagement = {}
+    for item_id, summary in (stats or {}).items():
+        if summary["count"]:
+            mean = summary["boosts"]["mean"] + summary["favourites"]["mean"]
+            engagement[item_id] = 1 + mean
+    default = sum(engagement.values()) / len(engagement) if engagement else 1
+    weights = []
+    for item in items:
+        weight = manual.get(item.text, manual.get(item.id))
+        if weight is None:
+            weight = engagement.get(item.id, default)
+        weights.append(float(weight))
+    return weights
+
+
+def stats_mtime() -> float | None:
+    """Get when the item stats were last written, or None if they never were"""
+    try:
+        return os.path.getmtime(ITEM_STATS_FILE)
+    except FileNotFoundError:
+        return None
+
+
+def table_digest(
+    items: tuple[Item, ...], manual: dict[str, float], mtime: float | None
+) -> str:
+    """Hash what a list's weights come from, to tell when its table needs rebuilding
+
+    That's the item ids, the manual weights and when the item stats were
+    written, so checking a saved table doesn't mean working out the weights.
+    """
+    data = ids_digest(items) + json.dumps([manual, mtime], sort_keys=True)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+def load_alias_tables(
+    lists: dict[str, tuple[Item, ...]], manual: dict[str, dict[str, float]]
+) -> dict[str, AliasTable]:
+    """Get an alias table for each list, only rebuilding the ones that changed
+
+    Tables are saved to ALIAS_FILE along with a digest of what their weights
+    came from (see table_digest()). A list whose digest still matches reuses
+    its saved table without its weights being worked out again, so that's
+    only redone when arrays.py, the manual weights or the item stats change.
+    """
+    saved = {}
+    if os.path.isfile(ALIAS_FILE):
+        with open(ALIAS_FILE, "r") as f:
+            saved = json.load(f)
+    mtime = stats_mtime()
+    stats = None
+
+    tables = {}
+    changed = False
+    for name, items in lists.items():
+        digest = table_digest(items, manual.get(name, {}), mtime)
+        table = saved.get(name)
+        if table is not None and table["digest"] == digest:
+            tables[name] = AliasTable(
+                unpack(table["thresholds"]), unpack(table["aliases"])
+            )
+            continue
+        log.info("Building the alias table for %s", name)
+        if stats is None:
+            stats = load_item_stats() or {}
+        weights = item_weights(items, manual.get(name, {}), stats.get(name))
+        tables[name] = AliasTable.build(weights)
+        saved[name] = {
+            "digest": digest,
+            "thresholds": pack(tables[name].thresholds),
+            "aliases": pack(tables[name].aliases),
+        }
+        changed = True
+
+    if changed:
+        with open(ALIAS_FILE + ".tmp", "w") as f:
+            json.dump(saved, f)
+        os.replace(ALIAS_FILE + ".tmp", ALIAS_FILE)
+    return tables
+
+
+class AliasTables:
+    """The alias table for each list, kept in memory between picks
+
+    arrays.py and the manual weights can't change while the process runs, so
+    the only thing to check before a pick is whether the item stats file has
+    been rewritten, which is one stat() call. The tables are only loaded
+    again (see load_alias_tables()) when it has.
+    """
+
+    def __init__(
+        self, lists: dict[str, tuple[Item, ...]], manual: dict[str, dict[str, float]]
+    ) -> None:
+        self.lists = lists
+        self.manual = manual
+        self.stats_mtime: float | None = None
+        self.tables: dict[str, AliasTable] = {}
+
+    def get(self) -> dict[str, AliasTable]:
+        """Get the tables, reloading them if the item stats have changed"""
+        mtime = stats_mtime()
+        if not self.tables or mtime != self.stats_mtime:
+            self.tables = load_alias_tables(self.lists, self.manual)
+            self.stats_mtime = mtime
+        return self.tables
+
+
+def draw_unused(bag: ShuffleBag, table: AliasTable) -> int:
+    """Draw a weighted position that hasn't been used this cycle, and mark it used
+
+    Draws that land on used positions are thrown away. If too many in a row
+    do, which happens when the heavy items are all used up, the next position
+    in the bag is taken instead.
+    """
+    for _ in range(MAX_REJECTIONS):
+        index = table.draw()
+        if index not in bag:
+            bag.add(index)
+            return index
+    return bag.next()
@@ -0,0 +1,89 @@
+import json
+import random
+import weights
+from collections import Counter
+from state import ShuffleBag
+from treats import compile_items
+from weights import AliasTable, draw_unused, item_weights, load_alias_tables
+
+FOLX = compile_items(["Foxes", "Bees", "Cryptids"])
+TREATS = compile_items(["a headpat", "a new GPU"])
+
+
+def test_alias_table_follows_weights():
+    random.seed(1)
+    table = AliasTable.build([1, 2, 0, 5])
+    counts = Counter(table.draw() for _ in range(80000))
+    assert counts[2] == 0
+    for index, weight in ((0, 1), (1, 2), (3, 5)):
+        assert abs(counts[index] / 80000 - weight / 8) < 0.01
+
+
+def test_item_weights():
+    stats = {
+        FOLX[0].id: {
+            "count": 3,
+            "boosts": {"mean": 2.0},
+            "favourites": {"mean": 1.0},
+        },
+        FOLX[1].id: {"count": 0, "last_posted": None},
+    }
+    # Unposted entries get the average of the posted ones
+    assert item_weights(FOLX, {}, stats) == [4.0, 4.0, 4.0]
+    assert item_weights(FOLX, {"Bees": 0.5, FOLX[2].id: 9}, stats) == [4.0, 0.5, 9.0]
+    assert item_weights(FOLX, {}, None) == [1.0, 1.0, 1.0]
+
+
+def test_alias_tables_are_reused(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    lists = {"folx": FOLX, "treats": TREATS}
+    first = load_alias_tables(lists, {})
+    saved = json.loads((tmp_path / weights.ALIAS_FILE).read_text())
+
+    built = []
+    build = AliasTable.build
+    monkeypatch.setattr(
+        AliasTable, "build", classmethod(lambda cls, w: built.append(w) or build(w))
+    )
+    second = load_alias_tables(lists, {"treats": {"a headpat": 3}})
+    # Only the list whose weights changed was rebuilt
+    assert built == [[3.0, 1.0]]
+    assert second["folx"].thresholds == first["folx"].thresholds
+    changed = json.loads((tmp_path / weights.ALIAS_FILE).read_text())
+    assert changed["folx"] == saved["folx"]
+    assert changed["treats"] != saved["treats"]
+
+    # Matching tables are used as they are, without working out any weights
+    monkeypatch.setattr(weights, "item_weights", None)
+    third = load_alias_tables(lists, {"treats": {"a headpat": 3}})
+    assert third["treats"].thresholds == second["treats"].thresholds
+
+
+def test_draw_unused_has_no_repeats():
+    bag = ShuffleBag(50)
+    table = AliasTable.build([100] + [1] * 49)
+    drawn = [draw_unused(bag, table) for _ in range(50)]
+    assert sorted(drawn) == list(range(50))
+    assert bag.is_full()
+
+
+def test_alias_tables_reload_only_when_stats_change(tmp_path, monkeypatch):
+    import os
+
+    monkeypatch.chdir(tmp_path)
+    loads = []
+    load = weights.load_alias_tables
+    monkeypatch.setattr(
+        weights, "load_alias_tables", lambda *args: loads.append(1) or load(*args)
+    )
+    tables = weights.AliasTables({"folx": FOLX, "treats": TREATS}, {})
+    first = tables.get()
+    assert tables.get() is first
+    assert len(loads) == 1
+
+    stats = tmp_path / weights.ITEM_STATS_FILE
+    stats.write_text(json.dumps({"folx": {}, "treats": {}}))
+    os.utime(stats, (1, 1))
+    tables.get()
+    tables.get()
+    assert len(loads) == 2